@@ -7,60 +7,438 @@ that provides an interface for browsing and managing a catalog of Old
 Time Radio (OTR) genres and programs. It is written in Python 2 and
 leverages Google oauth for user login.
 
-Usage:
-    python application.py
+The app is configured by create_app() (see otrcatalog.wsgi). The
+database schema is created by "python manage.py init-db".
 
 For additional information, please see the README file.
 """
 
-from models import Base, User, Genre, Program
-from db_creds import db_creds
+# Start of app import, for measuring startup time (see create_app); must
+# be imported first.
+from startup import IMPORT_STARTED
+from models import User, Genre, Program
+from database import db, pool_capacity
+from catalog_cache import GenreCache, PageCache
+from pagination import decode_cursor, encode_cursor, keyset_page, page_size
+from json_stream import buffered, json_list, catalog_json, catalog_ndjson
+from conditional import conditional_get, version_etag
+from search import search_programs
+from suggest import SuggestIndex, normalize, suggest_programs
+from catalog_stats import catalog_stats
+from change_feed import changes_after, latest_change
+from bulk_import import FORMATS, import_programs, read_rows
+from metrics import Metrics
+from google_client import GoogleClient
+from revocation import RevocationQueue
+from assets import Assets
+from compression import ENCODINGS, CompressionMiddleware
+from rate_limit import Admission, TokenBuckets, retry_after
+from snapshot import CatalogSnapshot
+from read_model import ReadModel, ReadModelWriter
+import template_cache
 from flask import (Flask, jsonify, request, redirect, url_for, abort, g,
-                   render_template, flash, make_response,
-                   session as login_session)
+                   render_template, flash, make_response, Response,
+                   Markup, stream_with_context, session as login_session)
 from functools import wraps
 from flask_httpauth import HTTPBasicAuth
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker, validates
-from sqlalchemy import create_engine, event
+from sqlalchemy.orm import relationship, validates
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+from timeit import default_timer as timer
 
-import httplib2
 import requests
 import json
 import sys
 import random
 import string
 import os
+import time
 
-from oauth2client.client import flow_from_clientsecrets
+from oauth2client.client import OAuth2WebServerFlow
 from oauth2client.client import FlowExchangeError
 
 
-# Connect to Database and create database session.
-dbURL = "{}://{}:{}@{}:{}/{}".format(
-                                     db_creds['driver'],
-                                     db_creds['user'],
-                                     db_creds['passwd'],
-                                     db_creds['host'],
-                                     db_creds['port'],
-                                     db_creds['database'])
-engine = create_engine(dbURL)
-
-Base.metadata.bind = engine
-DBSession = sessionmaker(bind=engine)
-session = DBSession()
+# Request-scoped database session; the engine is created on first use.
+session = db.session
 
 
 app = Flask(__name__)
 
-# Retrieve client id from client_secrets file.
+# Compress HTML and JSON responses for clients which accept it.
+compression = CompressionMiddleware(app.wsgi_app)
+app.wsgi_app = compression
+
+# Directory of compiled template cache (see create_app).
+app.config.setdefault('TEMPLATE_CACHE_DIR',
+                      os.path.join(app.root_path, 'template_cache'))
+
+# Link to and serve fingerprinted static assets (see assets.py).
+assets = Assets()
+assets.install(app)
+
+
+@app.teardown_appcontext
+def shutdown_session(exception=None):
+    """Release the request's database session back to the pool."""
+    session.remove()
+
+
+# Seconds for which a user's reads go to the primary database after the
+# user's own write, so that they see it despite replication lag.
+app.config.setdefault('PRIMARY_STICKY_SECONDS', 10)
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+@app.before_request
+def routeReads():
+    """Send read-only requests' queries to a replica database, if any.
+
+    Requests which may write (e.g., POSTs to add, edit or delete genres
+    and programs, or to log in) use the primary, as do all requests from
+    a user within PRIMARY_STICKY_SECONDS of their last write.
+    """
+    session().use_replica = (
+        request.method in SAFE_METHODS and
+        login_session.get('primary_until', 0) < time.time())
+
+
+@app.after_request
+def stickToPrimary(response):
+    """Pin the user's reads to the primary after a successful write."""
+    if request.method not in SAFE_METHODS and response.status_code < 400:
+        login_session['primary_until'] = (
+            time.time() + app.config['PRIMARY_STICKY_SECONDS'])
+    return response
+
+
+# Request rate limits per client IP address, by endpoint class (see
+# requestClass): (requests per second, burst). A class without an entry
+# is not limited. MAX_CONCURRENT_REQUESTS caps the requests a process
+# handles at once; it defaults to the size of the database connection
+# pool (pool_size + max_overflow), and None removes the cap.
+app.config.setdefault('RATE_LIMITS', {
+    'json': (10, 50),
+    'browse': (5, 50),
+    'login': (0.2, 10),
+    'write': (1, 30),
+})
+LOGIN_ENDPOINTS = ('login', 'gconnect', 'gdisconnect', 'disconnect')
+UNLIMITED_ENDPOINTS = ('static', 'showMetrics')
+JSON_ENDPOINTS = ('showChanges', 'suggestPrograms')
+rate_limiter = TokenBuckets()
+admission = Admission()
+
+
+def requestClass():
+    """Return the rate limit class of the current request.
+
+    Returns:
+        str: 'login' (the OAuth flow), 'write' (requests which may
+        change the catalog), 'json' (JSON endpoints), 'browse' (other
+        pages) or None (not limited).
+    """
+    if request.endpoint in UNLIMITED_ENDPOINTS:
+        return None
+    if request.endpoint in LOGIN_ENDPOINTS:
+        return 'login'
+    if request.method not in SAFE_METHODS:
+        return 'write'
+    if request.endpoint in JSON_ENDPOINTS:
+        return 'json'
+    if request.url_rule is not None and 'JSON' in request.url_rule.rule:
+        return 'json'
+    return 'browse'
+
+
+def refuse(status, msg, wait):
+    """Return a 'status' error response asking client to retry later."""
+    response = make_response(json.dumps(msg), status)
+    response.headers['Content-Type'] = 'application/json'
+    response.headers['Retry-After'] = retry_after(wait)
+    return response
+
+
+@app.before_request
+def admitRequest():
+    """Refuse requests over client's rate limit or process's capacity.
+
+    Returns:
+        None if the request may proceed; otherwise, a 429 (rate limit)
+        or 503 (overloaded) response with a Retry-After header.
+    """
+    cls = requestClass()
+    limit = app.config['RATE_LIMITS'].get(cls)
+    if limit is not None:
+        wait = rate_limiter.take(request.remote_addr, cls, *limit)
+        if wait:
+            return refuse(429, 'Too many requests.', wait)
+    if cls is None:
+        return None
+    if 'MAX_CONCURRENT_REQUESTS' in app.config:
+        cap = app.config['MAX_CONCURRENT_REQUESTS']
+    else:
+        cap = pool_capacity(db.pool)
+    if not admission.enter(cap):
+        return refuse(503, 'Server busy.', 1)
+    g.admitted = True
+
+
+@app.teardown_request
+def releaseRequest(exception=None):
+    """Release the concurrency slot taken by admitRequest."""
+    if g.pop('admitted', False):
+        admission.leave()
+
+
+# Number of programs per page in genre program listings.
+PROGRAM_PAGE_SIZE = 50
+PROGRAM_PAGE_SIZE_MAX = 200
+
+# Number of results per page of search results.
+SEARCH_PAGE_SIZE = 20
+SEARCH_PAGE_SIZE_MAX = 100
+
+# Number of rows fetched per round trip by streaming exports.
+YIELD_PER = 500
+
+# Maximum number of ids per batch (multi-get) JSON request, and the
+# largest id (that of an INTEGER primary key) which may be requested.
+BATCH_SIZE_MAX = 500
+ID_MAX = 2 ** 31 - 1
+
+# Number of programs suggested for typed text.
+SUGGEST_LIMIT = 10
+SUGGEST_LIMIT_MAX = 50
+
+# Number of changes per page of the change feed.
+CHANGES_PAGE_SIZE = 100
+CHANGES_PAGE_SIZE_MAX = 1000
+
+# Memory-mapped read model of genres and program summaries shared by all
+# processes (see read_model.py), if READ_MODEL_PATH is set (see
+# create_app). Genre lists and genre pages are read from it, when it is
+# current, instead of the database.
+app.config.setdefault('READ_MODEL_PATH', None)
+read_model = ReadModel()
+
+
+def readModelUsable():
+    """Return True if the request may read from the read model.
+
+    Like a replica, the read model may lag behind the primary database,
+    so it is only read by requests which routeReads lets read from a
+    replica; a user's requests within PRIMARY_STICKY_SECONDS of their
+    own write (which may have been made by another process) are not.
+    """
+    return session().use_replica and read_model.usable()
+
+
+def loadGenres():
+    """Return the genre list, with program counts, in name order, and
+    its version (see GenreCache).
+
+    The version is read before the list, so that a write committed in
+    between makes the list newer than its version rather than older.
+    """
+    if readModelUsable():
+        version = read_model.version
+        return read_model.genres(), (version,)
+    version = session.query(func.count(Genre.id), lastChange(Genre)).one()
+    genres = session.query(Genre.id, Genre.name,
+                           Genre.program_count).order_by(Genre.name).all()
+    return genres, tuple(version)
+
+
+# Cache the sorted genre list (with program counts) used by the
+# navigation sidebar.
+genre_cache = GenreCache(loadGenres)
+
+
+def requestGenres():
+    """Return the genre list and its version (see loadGenres) for the
+    request.
+
+    The list is read from the genre cache, unless routeReads has sent
+    the request to the primary database (e.g., within
+    PRIMARY_STICKY_SECONDS of the user's own write), since the cache may
+    have been filled from a replica or the read model before the write.
+    """
+    if not session().use_replica:
+        return loadGenres()
+    return genre_cache.get()
+
+
+@app.context_processor
+def inject_nav():
+    """Make the cached navigation sidebar available to all templates."""
+    def nav_html(genre=None):
+        """Return rendered nav.html with 'genre' (if any) selected."""
+        selected = genre.id if genre else None
+        show_add = request.path != url_for('addGenre')
+
+        def render(genres):
+            return Markup(render_template('nav.html', genres=genres,
+                                          genre=genre))
+        if not session().use_replica:
+            # The cached list may predate the user's latest write.
+            return render(requestGenres()[0])
+        return genre_cache.fragment((selected, show_add), render)
+    return dict(nav_html=nav_html)
+
+
+# Cache rendered pages served to anonymous users.
+page_cache = PageCache(max_entries=1000)
+
+
+def catalogChanged(kind):
+    """Update in-process caches after a committed catalog write.
+
+    Args:
+        kind (str): Kind of record written ('genre' or 'program'). Both
+            kinds invalidate the genre cache, since the navigation
+            sidebar shows each genre's program count.
+    """
+    genre_cache.invalidate()
+    page_cache.invalidate()
+    catalog_snapshot.changed()
+    if kind == 'program':
+        suggest_index.changed()
+    if read_model.path is not None:
+        # Read from the database until the read model includes the write.
+        read_model.expect(latest_change(session))
+        read_model_writer.changed()
+
+
+# Count queries and measure latency per endpoint (see /metrics). Set
+# DB_TIMING_HEADERS to report each response's query count and database
+# time in X-DB-Queries/X-DB-Time headers.
+app.config.setdefault('DB_TIMING_HEADERS', False)
+metrics = Metrics()
+metrics.install(app, Engine)
+metrics.register('otr_genre_cache_lookups_total', 'counter',
+                 'Genre cache lookups, by result.',
+                 lambda: {(('result', 'hit'),): genre_cache.hits,
+                          (('result', 'miss'),): genre_cache.misses})
+metrics.register('otr_page_cache_lookups_total', 'counter',
+                 'Page cache lookups, by result.',
+                 lambda: {(('result', 'hit'),): page_cache.hits,
+                          (('result', 'miss'),): page_cache.misses})
+metrics.register('otr_page_cache_evictions_total', 'counter',
+                 'Page cache entries evicted to make room for new ones.',
+                 lambda: page_cache.evictions)
+metrics.register('otr_page_cache_entries', 'gauge',
+                 'Pages currently cached.',
+                 lambda: page_cache.stats()['entries'])
+metrics.register('otr_rate_limited_total', 'counter',
+                 'Requests refused by rate limits, by endpoint class.',
+                 lambda: dict(((('class', k),), v)
+                              for k, v in rate_limiter.limited.items()))
+metrics.register('otr_requests_shed_total', 'counter',
+                 'Requests refused because the process was at capacity.',
+                 lambda: admission.shed)
+metrics.register('otr_requests_in_flight', 'gauge',
+                 'Requests being handled by the process.',
+                 lambda: admission.in_flight)
+
+
+# Path of client_secrets file.
 CLIENT_SECRETS_PATH = os.path.join(
                                    os.path.dirname(__file__),
                                    'client_secrets.json'
                                   )
-CLIENT_ID = json.loads(
-                       open(CLIENT_SECRETS_PATH, 'r').read()
-                      )['web']['client_id']
+_client_secrets = None
+
+
+def clientSecrets():
+    """Return 'web' client settings from client_secrets file.
+
+    The file is read on first use only.
+    """
+    global _client_secrets
+    if _client_secrets is None:
+        with open(CLIENT_SECRETS_PATH, 'r') as f:
+            _client_secrets = json.load(f)['web']
+    return _client_secrets
+
+
+def create_app(config=None):
+    """Configure and return the application.
+
+    Applies 'config' to the app's config, points the database at its
+    DATABASE_URL, REPLICA_URLS and DB_POOL settings (if given), loads
+    the client secrets and the static asset manifest (see "manage.py
+    build-assets"), caches compiled templates in TEMPLATE_CACHE_DIR
+    (see "manage.py compile-templates") and reads the read model at
+    READ_MODEL_PATH (see read_model.py). The database engines
+    themselves are created on first use, and the schema is not touched
+    (see "manage.py init-db"). The time taken from the start of the app
+    import is logged and reported by /metrics as otr_startup_seconds.
+
+    Args:
+        config (dict): Config values, e.g. SECRET_KEY, DATABASE_URL
+            (overrides db_creds.py), REPLICA_URLS (list; overrides
+            db_creds.db_replicas), DB_POOL (overrides db_creds.db_pool),
+            PRIMARY_STICKY_SECONDS, DB_TIMING_HEADERS and
+            TEMPLATE_CACHE_DIR (default: "template_cache" in the app
+            directory; None disables the cache) and READ_MODEL_PATH
+            (default: None, which disables the read model).
+
+    Returns:
+        Flask: The configured app.
+    """
+    app.config.update(config or {})
+    db.configure(url=app.config.get('DATABASE_URL'),
+                 pool=app.config.get('DB_POOL'),
+                 replica_urls=app.config.get('REPLICA_URLS'))
+    clientSecrets()
+    assets.load()
+    if app.config['TEMPLATE_CACHE_DIR']:
+        template_cache.install(app, app.config['TEMPLATE_CACHE_DIR'])
+    read_model.configure(app.config['READ_MODEL_PATH'])
+    app.config['STARTUP_SECONDS'] = timer() - IMPORT_STARTED
+    app.logger.info('App started in %.3fs', app.config['STARTUP_SECONDS'])
+    return app
+
+
+metrics.register('otr_startup_seconds', 'gauge',
+                 'Seconds from start of app import until create_app() '
+                 'finished.',
+                 lambda: app.config.get('STARTUP_SECONDS', 'NaN'))
+
+
+# Shared, pooled client for calls to Google's OAuth endpoints.
+OAUTH_TIMEOUT = 10
+google = GoogleClient(timeout=(3.05, OAUTH_TIMEOUT))
+metrics.register('otr_tokeninfo_cache_lookups_total', 'counter',
+                 'Google token info cache lookups, by result.',
+                 lambda: {(('result', 'hit'),): google.tokeninfo_hits,
+                          (('result', 'miss'),): google.tokeninfo_misses})
+
+
+def revokeToken(access_token):
+    """Revoke 'access_token' for revocations queue.
+
+    Returns:
+        True if the token was revoked, or was rejected as invalid (e.g.,
+        already expired or revoked) so that retrying cannot help;
+        otherwise, False.
+    """
+    return google.revoke_status(access_token) in (200, 400)
+
+
+# Revoke tokens of logged-out users in the background.
+revocations = RevocationQueue(revokeToken)
+metrics.register('otr_token_revocations_pending', 'gauge',
+                 'Token revocations queued or in progress.',
+                 lambda: revocations.pending)
+metrics.register('otr_token_revocations_total', 'counter',
+                 'Token revocations completed, by result.',
+                 lambda: {(('result', 'succeeded'),): revocations.succeeded,
+                          (('result', 'failed'),): revocations.failed})
+metrics.register('otr_token_revocation_retries_total', 'counter',
+                 'Token revocation attempts retried.',
+                 lambda: revocations.retries)
 
 
 # Create decorator to ensure that user is logged in before executing
@@ -85,15 +463,323 @@ def login_required(f):
     return decorated_function
 
 
+def catalogRows():
+    """Return a streaming query of (genre, program) pairs in the catalog.
+
+    Pairs are ordered by genre name and then program name; program is
+    None for a genre which contains no programs.
+    """
+    rows = session.query(Genre, Program).outerjoin(
+                                                   Program,
+                                                   Program.genre_id == Genre.id
+                                                  ).order_by(
+                                                             Genre.name,
+                                                             Genre.id,
+                                                             Program.name,
+                                                             Program.id)
+    return rows.yield_per(YIELD_PER)
+
+
+def catalogVersion():
+    """Return the catalog's version: the id of its latest change."""
+    try:
+        return latest_change(session)
+    finally:
+        session.remove()
+
+
+def catalogDocument():
+    """Return the full catalog as a JSON document (see /catalog/JSON)."""
+    try:
+        return ''.join(catalog_json(catalogRows()))
+    finally:
+        session.remove()
+
+
+# Serve the full catalog from a prebuilt, precompressed copy, rebuilt in
+# the background after writes.
+catalog_snapshot = CatalogSnapshot(
+    catalogDocument, catalogVersion,
+    lambda body: dict((i, compression.compress(body, i)) for i in ENCODINGS))
+metrics.register('otr_catalog_snapshot_builds_total', 'counter',
+                 'Catalog snapshots built, by result.',
+                 lambda: {(('result', 'succeeded'),): catalog_snapshot.builds,
+                          (('result', 'failed'),): catalog_snapshot.failures})
+
+
+def readModelRows():
+    """Return (genres, programs) for the read model (see read_model.py).
+
+    Rows are listed in the order of loadGenres and genrePrograms, so that
+    pages read from the read model match those read from the database.
+    """
+    try:
+        genres = session.query(Genre.id, Genre.name,
+                               Genre.user_id).order_by(Genre.name).all()
+        programs = session.query(Program.id, Program.name, Program.genre_id,
+                                 Program.yearBegan,
+                                 Program.yearEnded).order_by(
+                                     Program.name, Program.id).all()
+        return genres, programs
+    finally:
+        session.remove()
+
+
+# Rewrite the read model in the background after writes.
+read_model_writer = ReadModelWriter(read_model, readModelRows,
+                                    catalogVersion)
+metrics.register('otr_read_model_writes_total', 'counter',
+                 'Read model files written, by result.',
+                 lambda: {(('result', 'succeeded'),): read_model_writer.builds,
+                          (('result', 'failed'),): read_model_writer.failures})
+metrics.register('otr_read_model_generation', 'gauge',
+                 'Generation of the read model file loaded by the process.',
+                 lambda: read_model.generation or 0)
+
+
+# Suggest program names from memory (see suggest.py).
+suggest_index = SuggestIndex(session)
+metrics.register('otr_suggest_index_builds_total', 'counter',
+                 'Program suggestion index builds, by result.',
+                 lambda: {(('result', 'succeeded'),): suggest_index.builds,
+                          (('result', 'failed'),): suggest_index.failures})
+
+
+@app.before_request
+def refreshReadModel():
+    """Load a new read model file, if any process has written one.
+
+    Caches filled from the previous file are dropped. The process's
+    writer thread is started on first use, so that the file is created
+    and kept current even if this process never writes.
+    """
+    if read_model.path is None:
+        return
+    read_model_writer.start()
+    if read_model.refresh():
+        genre_cache.invalidate()
+        page_cache.invalidate()
+
+
+def lastChange(model):
+    """Return SQL expression for latest change time of 'model' rows."""
+    return func.max(func.coalesce(model.time_updated, model.time_created))
+
+
+def genresVersion():
+    """Return (etag, last_modified) for the genre list.
+
+    A deleted genre leaves no timestamp behind, so Last-Modified is not
+    offered for this resource; the ETag also covers the row count. The
+    ETag is that of the genre list which showGenresJSON serves.
+    """
+    return version_etag(*requestGenres()[1]), None
+
+
+def genreProgramsVersion(genre_id):
+    """Return (etag, last_modified) for the programs in a genre.
+
+    deleteProgram updates the genre's time_updated, so the latest of the
+    genre and program timestamps changes whenever the list does.
+    """
+    genre_changed = session.query(lastChange(Genre)).filter(
+                                        Genre.id == genre_id).as_scalar()
+    count, changed, genre_changed = session.query(
+                                        func.count(Program.id),
+                                        lastChange(Program),
+                                        genre_changed
+                                       ).filter(
+                                        Program.genre_id == genre_id).one()
+    if genre_changed is None:
+        return None, None
+    last_modified = max(changed or genre_changed, genre_changed)
+    return version_etag(count, changed, genre_changed), last_modified
+
+
+def programVersion(genre_id, program_id):
+    """Return (etag, last_modified) for a single program."""
+    changed = session.query(
+                            func.coalesce(Program.time_updated,
+                                          Program.time_created)
+                           ).filter_by(genre_id=genre_id,
+                                       id=program_id).scalar()
+    if changed is None:
+        return None, None
+    return version_etag(changed), changed
+
+
+def streamResponse(chunks, mimetype):
+    """Return a response which sends 'chunks' as they are generated."""
+    return Response(stream_with_context(buffered(chunks)), mimetype=mimetype)
+
+
+def genrePrograms(genre_id):
+    """Return the page of programs in a genre requested by query args.
+
+    Programs are returned in name order, PROGRAM_PAGE_SIZE at a time
+    unless the 'limit' query arg asks for a different page size (up to
+    PROGRAM_PAGE_SIZE_MAX). The 'after' query arg holds the cursor
+    returned for the previous page.
+
+    Args:
+        genre_id (int): Primary key of specified genre.
+
+    Returns:
+        tuple: (programs, next_cursor) where next_cursor is None if
+        this is the last page. If the cursor is invalid, 400 error.
+    """
+    limit = page_size(request.args.get('limit', type=int),
+                      PROGRAM_PAGE_SIZE, PROGRAM_PAGE_SIZE_MAX)
+    query = session.query(Program).filter_by(genre_id=genre_id)
+    try:
+        return keyset_page(query, [Program.name, Program.id],
+                           request.args.get('after'), limit)
+    except ValueError:
+        abort(400)
+
+
+def readModelPrograms(genre_id):
+    """Return the page of programs in a genre, from the read model.
+
+    Accepts the same query args, and returns the same page and cursor,
+    as genrePrograms, which serves the page instead if the cursor's
+    program is not in the read model.
+    """
+    limit = page_size(request.args.get('limit', type=int),
+                      PROGRAM_PAGE_SIZE, PROGRAM_PAGE_SIZE_MAX)
+    after = None
+    if request.args.get('after'):
+        try:
+            after = decode_cursor(request.args['after'], (basestring, int))
+        except ValueError:
+            abort(400)
+    page = read_model.programs(genre_id, after, limit)
+    if page is None:
+        return genrePrograms(genre_id)
+    programs, more = page
+    if not more:
+        return programs, None
+    return programs, encode_cursor([programs[-1].name, programs[-1].id])
+
+
+def requestedIds():
+    """Return the ids requested by the 'ids' query arg(s), if any.
+
+    Ids may be given comma-separated (e.g., "?ids=1,2,3"), in repeated
+    args (e.g., "?ids=1&ids=2") or both. Duplicates are dropped; the
+    order of first appearance is kept.
+
+    Returns:
+        list: Requested ids (ints), or None if no 'ids' arg is given.
+        If an id is not an integer from 0 to ID_MAX, or 'ids' args are
+        given but list no ids (e.g., "?ids="), or more than
+        BATCH_SIZE_MAX ids are requested, 400 error.
+    """
+    values = request.args.getlist('ids')
+    if not values:
+        return None
+    ids = []
+    for value in ','.join(values).split(','):
+        value = value.strip()
+        if not value:
+            continue
+        # ASCII digits only, and no more than ID_MAX has.
+        if (len(value) > len(str(ID_MAX)) or value.strip(string.digits) or
+                int(value) > ID_MAX):
+            abort(400)
+        if int(value) not in ids:
+            ids.append(int(value))
+    if not ids or len(ids) > BATCH_SIZE_MAX:
+        abort(400)
+    return ids
+
+
+def batchJSON(model, key, ids):
+    """Return JSON data representing the 'model' records with 'ids'.
+
+    The records are fetched in a single query and listed (as 'key') in
+    the order requested; ids with no record are listed as 'missing'.
+    """
+    found = {}
+    if ids:
+        found = dict((i.id, i) for i in session.query(model).filter(
+                                                     model.id.in_(ids)))
+    return jsonify({key: [found[i].serialize for i in ids if i in found],
+                    'missing': [i for i in ids if i not in found]})
+
+
+def searchResults():
+    """Return the page of search results requested by query args.
+
+    Query args:
+        q (str): Search text.
+        page (int): Page number, starting at 1 (optional).
+        limit (int): Number of results per page (optional).
+
+    Returns:
+        tuple: (q, results, page, limit, more) where 'more' is True if
+        there is a following page.
+    """
+    q = request.args.get('q', '').strip()
+    limit = page_size(request.args.get('limit', type=int),
+                      SEARCH_PAGE_SIZE, SEARCH_PAGE_SIZE_MAX)
+    page = max(request.args.get('page', 1, type=int), 1)
+    if not q:
+        return q, [], page, limit, False
+    results = search_programs(session, q, limit + 1, (page - 1) * limit)
+    return q, results[:limit], page, limit, len(results) > limit
+
+
+# Create decorator to serve anonymous users' pages from page_cache.
+def cached_for_anonymous(f):
+    """Serve wrapped view's responses to anonymous users from page_cache.
+
+    Pages are cached by path and query string. Logged-in users, and
+    users with flashed messages waiting to be shown, always get a
+    freshly rendered page since their header area differs. Cached pages
+    are compressed for clients which accept it once per encoding, and
+    the compressed body is then reused for later hits.
+
+    Returns:
+        Cached response body if available; otherwise, the wrapped
+        function's response (which is cached if successful).
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_name' in login_session or '_flashes' in login_session:
+            return f(*args, **kwargs)
+        key = request.full_path
+        cached = page_cache.get(key)
+        if cached is not None:
+            body, mimetype, encoded = cached
+            encoding = compression.negotiate(
+                request.headers.get('Accept-Encoding'))
+            if encoding is None or len(body) < compression.min_size:
+                return Response(body, mimetype=mimetype)
+            if encoding not in encoded:
+                encoded[encoding] = compression.compress(body, encoding)
+            response = Response(encoded[encoding], mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+            return response
+        generation = page_cache.generation
+        response = make_response(f(*args, **kwargs))
+        if response.status_code == 200 and not response.is_streamed:
+            page_cache.set(key, response.get_data(), response.mimetype,
+                           generation)
+        return response
+    return decorated_function
+
+
 # ENDPOINTS
 @app.route('/')
+@cached_for_anonymous
 def latestPrograms():
     """Show application home page.
 
     Returns:
         Page displaying 10 most recently added programs.
     """
-    genres = session.query(Genre).order_by('name').all()
     latest_progs = session.query(
                                  Program.id, Program.genre_id,
                                  Program.time_created, Program.name,
@@ -103,8 +789,7 @@ def latestPrograms():
                                       ).order_by(
                                                  Program.time_created.desc()
                                                 ).limit(10)
-    return render_template('latestPrograms.html', genres=genres,
-                           latest_progs=latest_progs)
+    return render_template('latestPrograms.html', latest_progs=latest_progs)
 
 
 @app.route('/genre/add', methods=['GET', 'POST'])
@@ -118,8 +803,7 @@ def addGenre():
         on POST: Redirect to page showing new genre after it's created.
     """
     if request.method == 'GET':
-        genres = session.query(Genre).order_by('name').all()
-        return render_template('addGenre.html', genres=genres)
+        return render_template('addGenre.html')
     elif request.method == 'POST':
         name = request.form.get('name')
         user_id = login_session['user_id']
@@ -132,28 +816,37 @@ def addGenre():
         genre = Genre(name=name, user_id=user_id)
         session.add(genre)
         session.commit()
+        catalogChanged('genre')
         flash("Genre \"%s\" created." % name)
         return redirect(url_for('showGenre', genre_id=genre.id))
 
 
 @app.route('/genre/<int:genre_id>')
 @app.route('/genre/<int:genre_id>/program')
+@cached_for_anonymous
 def showGenre(genre_id):
     """Show all programs within the specified genre.
 
     Args:
         genre_id (int): Primary key of specified genre.
 
+    Query args:
+        after (str): Cursor for the requested page (optional).
+        limit (int): Number of programs per page (optional).
+
     Returns:
-        Page showing specified genre and all programs within it.
+        Page showing specified genre and one page of programs within it.
     """
-    genres = session.query(Genre).order_by('name').all()
-    genre = session.query(Genre).filter_by(id=genre_id).one()
-    programs = session.query(Program).filter_by(
-                                                genre_id=genre_id
-                                               ).order_by('name').all()
-    return render_template('showGenre.html', genres=genres, genre=genre,
-                           programs=programs)
+    genre = read_model.genre(genre_id) if readModelUsable() else None
+    if genre is not None:
+        programs, next_cursor = readModelPrograms(genre_id)
+    else:
+        genre = session.query(Genre).filter_by(id=genre_id).one()
+        programs, next_cursor = genrePrograms(genre_id)
+    return render_template('showGenre.html', genre=genre, programs=programs,
+                           numPrograms=genre.program_count,
+                           next_cursor=next_cursor,
+                           limit=request.args.get('limit', type=int))
 
 
 @app.route('/genre/<int:genre_id>/delete', methods=['GET', 'POST'])
@@ -177,18 +870,15 @@ def deleteGenre(genre_id):
     if genre.user_id != login_session['user_id']:
         flash('You may not delete a genre which you did not create.')
         return redirect("/genre/%s" % genre_id)
-    numPrograms = session.query(Program).filter_by(
-                                                   genre_id=genre_id
-                                                  ).count()
-    if numPrograms > 0:
+    if genre.program_count > 0:
         flash('You may not delete a genre which contains programs.')
         return redirect("/genre/%s" % genre_id)
     if request.method == 'GET':
-        genres = session.query(Genre).order_by('name').all()
-        return render_template('deleteGenre.html', genres=genres, genre=genre)
+        return render_template('deleteGenre.html', genre=genre)
     elif request.method == 'POST':
         session.delete(genre)
         session.commit()
+        catalogChanged('genre')
         flash("Genre \"%s\" deleted." % genre.name)
         return redirect(url_for('latestPrograms'))
 
@@ -216,8 +906,7 @@ def editGenre(genre_id):
         flash('You may not edit a genre which you did not create.')
         return redirect("/genre/%s" % genre_id)
     if request.method == 'GET':
-        genres = session.query(Genre).order_by('name').all()
-        return render_template('editGenre.html', genres=genres, genre=genre)
+        return render_template('editGenre.html', genre=genre)
     elif request.method == 'POST':
         name = request.form.get('name')
         numThisGenre = session.query(Genre).filter_by(name=name).count()
@@ -226,6 +915,7 @@ def editGenre(genre_id):
             return redirect(url_for("editGenre", genre_id=genre.id))
         genre.name = name
         session.commit()
+        catalogChanged('genre')
         flash("Genre \"%s\" updated." % genre.name)
         return redirect(url_for('latestPrograms'))
 
@@ -244,9 +934,8 @@ def addProgram(genre_id):
         on POST: Redirect to read-only page showing program details.
     """
     if request.method == 'GET':
-        genres = session.query(Genre).order_by('name').all()
         genre = session.query(Genre).filter_by(id=genre_id).one()
-        return render_template('addProgram.html', genres=genres, genre=genre)
+        return render_template('addProgram.html', genre=genre)
     elif request.method == 'POST':
         name = request.form.get('name')
         yearBegan = request.form.get('yearBegan')
@@ -264,6 +953,7 @@ def addProgram(genre_id):
                           user_id=user_id)
         session.add(program)
         session.commit()
+        catalogChanged('program')
         flash("Program \"%s\" created." % program.name)
         return redirect(url_for('showProgram', genre_id=genre_id,
                                 program_id=program.id))
@@ -298,8 +988,7 @@ def editProgram(genre_id, program_id):
         return redirect(url_for('showProgram', genre_id=genre_id,
                                 program_id=program.id))
     if request.method == 'GET':
-        genres = session.query(Genre).order_by('name').all()
-        return render_template('editProgram.html', genres=genres, genre=genre,
+        return render_template('editProgram.html', genre=genre,
                                program=program)
     elif request.method == 'POST':
         name = request.form.get('name')
@@ -318,6 +1007,7 @@ def editProgram(genre_id, program_id):
         program.description = description
 
         session.commit()
+        catalogChanged('program')
         flash("Program \"%s\" updated." % program.name)
         return redirect(url_for('showProgram', genre_id=genre_id,
                                 program_id=program_id))
@@ -348,17 +1038,21 @@ def deleteProgram(genre_id, program_id):
         return redirect(url_for('showProgram', genre_id=genre_id,
                                 program_id=program_id))
     if request.method == 'GET':
-        genres = session.query(Genre).order_by('name').all()
-        return render_template('deleteProgram.html', genres=genres,
-                               genre=genre, program=program)
+        return render_template('deleteProgram.html', genre=genre,
+                               program=program)
     elif request.method == 'POST':
         session.delete(program)
+        # Mark the genre's program list as changed (see
+        # genreProgramsVersion).
+        genre.time_updated = func.now()
         session.commit()
+        catalogChanged('program')
         flash("Program \"%s\" deleted." % program.name)
         return redirect(url_for('showGenre', genre_id=genre_id))
 
 
 @app.route('/genre/<int:genre_id>/program/<int:program_id>/show')
+@cached_for_anonymous
 def showProgram(genre_id, program_id):
     """Show details of specified program.
 
@@ -369,11 +1063,92 @@ def showProgram(genre_id, program_id):
     Returns:
         Page showing program details.
     """
-    genres = session.query(Genre).order_by('name').all()
     genre = session.query(Genre).filter_by(id=genre_id).one()
     program = session.query(Program).filter_by(id=program_id).one()
-    return render_template('showProgram.html', genres=genres, genre=genre,
-                           program=program)
+    return render_template('showProgram.html', genre=genre, program=program)
+
+
+@app.route('/search')
+def search():
+    """Show programs whose name or description matches search text.
+
+    Returns:
+        Page showing one page of matching programs, best matches first.
+    """
+    q, results, page, limit, more = searchResults()
+    return render_template('search.html', q=q, results=results, page=page,
+                           limit=limit, more=more)
+
+
+def catalogStats():
+    """Return catalog statistics for the stats page and JSON endpoint.
+
+    Statistics are read from the catalog_stat summary table and the
+    genres' program counts, so the cost does not grow with the number
+    of programs.
+
+    Returns:
+        dict: 'programs' (total number), 'genres', 'years', 'decades'
+        and 'users', each a list of dicts with the number of
+        'programs' in, on air during, or added by it.
+    """
+    stats = catalog_stats(session)
+    users = dict(session.query(User.id, User.username).filter(
+                     User.id.in_([i for i, n in stats['users']])))
+    return {
+        'programs': stats['programs'],
+        'genres': [{'id': i.id, 'name': i.name, 'programs': i.program_count}
+                   for i in requestGenres()[0]],
+        'years': [{'year': year, 'programs': n}
+                  for year, n in stats['years']],
+        'decades': [{'decade': decade, 'programs': n}
+                    for decade, n in stats['decades']],
+        'users': [{'id': i, 'username': users.get(i), 'programs': n}
+                  for i, n in stats['users']],
+    }
+
+
+@app.route('/stats')
+@cached_for_anonymous
+def showStats():
+    """Show catalog statistics.
+
+    Returns:
+        Page showing numbers of programs per genre, per year and decade
+        on air, and per contributing user.
+    """
+    return render_template('stats.html', stats=catalogStats())
+
+
+@app.route('/programs/import', methods=['POST'])
+@login_required
+def importPrograms():
+    """Bulk import programs from an uploaded CSV or JSONL file.
+
+    The file is POSTed as the 'file' field of a multipart form. Its
+    format is taken from the 'format' query arg if given, otherwise from
+    the file name extension. Programs are credited to the logged-in
+    user.
+
+    Returns:
+        If user is not signed in, redirect to login page.
+        If no file is uploaded or its format is unknown, 400 error.
+        Otherwise, JSON report with number of programs inserted and
+            the line number and error messages for each rejected row.
+    """
+    upload = request.files.get('file')
+    if upload is None:
+        abort(400)
+    fmt = request.args.get('format')
+    if fmt is None:
+        fmt = os.path.splitext(upload.filename or '')[1].lstrip('.').lower()
+    if fmt not in FORMATS:
+        abort(400)
+    report = import_programs(session, read_rows(upload.stream, fmt),
+                             login_session['user_id'])
+    if report['inserted']:
+        catalogChanged('program')
+    return jsonify(report)
 
 
 @app.route('/login')
@@ -437,10 +1212,14 @@ def gconnect():
     try:
         # Upgrade the authorization code into a credentials object.
         print "Attempting to get credentials..."
-        oauth_flow = flow_from_clientsecrets(CLIENT_SECRETS_PATH,
-                                             scope='',
-                                             redirect_uri='postmessage')
-        credentials = oauth_flow.step2_exchange(auth_code)
+        secrets = clientSecrets()
+        oauth_flow = OAuth2WebServerFlow(secrets['client_id'],
+                                         secrets['client_secret'],
+                                         scope='',
+                                         redirect_uri='postmessage',
+                                         auth_uri=secrets['auth_uri'],
+                                         token_uri=google.urls['token'])
+        credentials = oauth_flow.step2_exchange(auth_code, http=google)
     except FlowExchangeError:
         response = make_response(
             json.dumps('Failed to upgrade the authorization code.'), 401)
@@ -455,10 +1234,13 @@ def gconnect():
 
     # Check that the access token is valid.
     access_token = credentials.access_token
-    url = ('https://www.googleapis.com/oauth2/v1/tokeninfo?access_token=%s'
-           % access_token)
-    h = httplib2.Http()
-    result = json.loads(h.request(url, 'GET')[1])
+    try:
+        result = google.tokeninfo(access_token)
+    except (requests.RequestException, ValueError):
+        response = make_response(
+            json.dumps('Failed to verify access token.'), 500)
+        response.headers['Content-Type'] = 'application/json'
+        return response
 
     # If there was an error in the access token info, abort.
     if result.get('error') is not None:
@@ -475,7 +1257,7 @@ def gconnect():
         return response
 
     # Verify that the access token is valid for this app.
-    if result.get('issued_to') != CLIENT_ID:
+    if result.get('issued_to') != clientSecrets()['client_id']:
         msg = "Token's client ID does not match app's."
         response = make_response(json.dumps(msg), 401)
         response.headers['Content-Type'] = 'application/json'
@@ -494,11 +1276,13 @@ def gconnect():
     login_session['google_user_id'] = google_user_id
 
     # Get user info from Google API.
-    userinfo_url = "https://www.googleapis.com/oauth2/v1/userinfo"
-    params = {'access_token': credentials.access_token, 'alt': 'json'}
-    answer = requests.get(userinfo_url, params=params)
-
-    data = answer.json()
+    try:
+        data = google.userinfo(credentials.access_token)
+    except (requests.RequestException, ValueError):
+        response = make_response(
+            json.dumps('Failed to retrieve user info.'), 500)
+        response.headers['Content-Type'] = 'application/json'
+        return response
 
     name = data['name']
     picture = data['picture']
@@ -559,11 +1343,11 @@ def gdisconnect():
         response.headers['Content-Type'] = 'application/json'
         return response
     # User is connected; attempt disconnect...
-    url = ('https://accounts.google.com/o/oauth2/revoke?token=%s'
-           % access_token)
-    h = httplib2.Http()
-    result = h.request(url, 'GET')[0]
-    if result['status'] == '200':
+    try:
+        revoked = google.revoke(access_token)
+    except requests.RequestException:
+        revoked = False
+    if revoked:
         msg = 'Successfully disconnected.'
         response = make_response(json.dumps(msg), 200)
         response.headers['Content-Type'] = 'application/json'
@@ -579,16 +1363,18 @@ def gdisconnect():
 def disconnect():
     """Disconnect logged-in user and remove related session variables.
 
-    Calls provider-specific disconnect function based on provider
-    specified in login session. Adds flash message with logout status.
+    Performs provider-specific disconnect based on provider specified in
+    login session (for Google, the access token is queued for revocation
+    in the background). Adds flash message with logout status.
 
     Returns:
         Redirect to application home page.
     """
     if 'provider' in login_session:
         if login_session['provider'] == 'google':
-            gdisconnect()
-            login_session.pop('access_token', None)
+            access_token = login_session.pop('access_token', None)
+            if access_token is not None:
+                revocations.submit(access_token)
             login_session.pop('google_user_id', None)
 
         # Add disconnect code for other login providers here as needed...
@@ -609,26 +1395,61 @@ def disconnect():
 
 # JSON ENDPOINTS
 @app.route('/genres/JSON')
+@conditional_get(genresVersion)
 def showGenresJSON():
-    """Return JSON data representing all genres in the database."""
-    genres = session.query(Genre).order_by('name').all()
-    return jsonify(Genres=[i.serialize for i in genres])
+    """Return JSON data representing all genres in the database.
+
+    Query args:
+        ids (str): Comma-separated ids of the genres to return, instead
+            of all genres (optional; see requestedIds). Ids with no
+            genre are listed in the 'missing' member.
+    """
+    ids = requestedIds()
+    if ids is not None:
+        return batchJSON(Genre, 'Genres', ids)
+    return jsonify(Genres=[{'name': i.name, 'id': i.id}
+                           for i in requestGenres()[0]])
 
 
 @app.route('/genre/<int:genre_id>/programs/JSON')
+@conditional_get(genreProgramsVersion)
 def showGenreProgramsJSON(genre_id):
     """Return JSON data representing all programs in specified genre.
 
     Args:
         genre_id (int): Primary key of specified genre.
+
+    Query args:
+        after (str): Cursor for the requested page (optional).
+        limit (int): Number of programs per page (optional).
+        stream (int): If 1, stream all programs in the genre instead
+            of returning a single page (optional).
+
+    The 'next' member of the returned data holds the URL of the following
+    page, or null if this is the last page.
     """
     genre = session.query(Genre).filter_by(id=genre_id).one()
-    programs = session.query(Program).filter_by(genre_id=genre_id
-                                                ).order_by('name').all()
-    return jsonify(Programs=[i.serialize for i in programs])
+    if request.args.get('stream', type=int) == 1:
+        programs = session.query(Program).filter_by(
+                                                    genre_id=genre_id
+                                                   ).order_by(
+                                                              Program.name,
+                                                              Program.id)
+        programs = programs.yield_per(YIELD_PER)
+        return streamResponse(
+            json_list('Programs', (i.serialize for i in programs)),
+            'application/json')
+    programs, next_cursor = genrePrograms(genre_id)
+    next_url = None
+    if next_cursor:
+        next_url = url_for('showGenreProgramsJSON', genre_id=genre_id,
+                           after=next_cursor,
+                           limit=request.args.get('limit', type=int))
+    return jsonify(Programs=[i.serialize for i in programs], next=next_url)
 
 
 @app.route('/genre/<int:genre_id>/program/<int:program_id>/JSON')
+@conditional_get(programVersion)
 def showProgramJSON(genre_id, program_id):
     """Return JSON data representing a specific program item.
 
@@ -636,8 +1457,169 @@ def showProgramJSON(genre_id, program_id):
         genre_id (int): Primary key of specified genre.
         program_id (int): Primary key of specified program.
     """
-    genre = session.query(Genre).filter_by(id=genre_id).one()
     program = session.query(Program).filter_by(genre_id=genre_id,
                                                id=program_id
                                                ).one()
     return jsonify(program.serialize)
+
+
+@app.route('/programs/JSON')
+def showProgramsJSON():
+    """Return JSON data representing the programs with the given ids.
+
+    Query args:
+        ids (str): Comma-separated ids of the programs to return (see
+            requestedIds).
+
+    The programs are fetched in one query and listed in the order
+    requested; ids with no program are listed in the 'missing' member.
+    If no ids are given or more than BATCH_SIZE_MAX are, 400 error.
+    """
+    ids = requestedIds()
+    if ids is None:
+        abort(400)
+    return batchJSON(Program, 'Programs', ids)
+
+
+@app.route('/programs/suggest')
+def suggestPrograms():
+    """Return JSON data listing programs whose names match typed text.
+
+    Query args:
+        q (str): Text typed so far. Programs whose name starts with it
+            (ignoring case) are listed first, then programs with a later
+            word which starts with it.
+        limit (int): Maximum number of programs (optional).
+
+    Programs are read from the in-memory suggestion index, or from the
+    database until the index is built.
+    """
+    q = request.args.get('q', '')
+    limit = page_size(request.args.get('limit', type=int),
+                      SUGGEST_LIMIT, SUGGEST_LIMIT_MAX)
+    programs = []
+    if normalize(q):
+        programs = suggest_index.suggest(q, limit)
+        if programs is None:
+            programs = suggest_programs(session, q, limit)
+    return jsonify(q=q, Programs=[{'id': i.id, 'name': i.name,
+                                   'genre_id': i.genre_id}
+                                  for i in programs])
+
+
+@app.route('/catalog/JSON')
+def showCatalogJSON():
+    """Return JSON data representing all genres and their programs.
+
+    The document is served from the catalog snapshot, without querying
+    the database, and compressed if the client accepts it. It may lag a
+    catalog write by a few seconds while the snapshot is rebuilt. Until
+    the first snapshot is built, the catalog is read with a server-side
+    cursor and streamed as it is encoded.
+    """
+    snapshot = catalog_snapshot.get()
+    if snapshot is None:
+        return streamResponse(catalog_json(catalogRows()),
+                              'application/json')
+    if request.if_none_match.contains_weak(snapshot.etag):
+        response = make_response('', 304)
+    else:
+        encoding = compression.negotiate(
+            request.headers.get('Accept-Encoding'))
+        if encoding in snapshot.encoded:
+            response = Response(snapshot.encoded[encoding],
+                                mimetype='application/json')
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response = Response(snapshot.body, mimetype='application/json')
+    # Compressed and uncompressed copies share the weak ETag.
+    response.set_etag(snapshot.etag, weak=True)
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+@app.route('/catalog/NDJSON')
+def showCatalogNDJSON():
+    """Stream the catalog as newline-delimited JSON.
+
+    Each genre record (type 'genre') is followed by records for its
+    programs (type 'program').
+    """
+    return streamResponse(catalog_ndjson(catalogRows()),
+                          'application/x-ndjson')
+
+
+@app.route('/changes')
+def showChanges():
+    """Return JSON data listing catalog changes, oldest first.
+
+    Each change gives the 'type' ('genre' or 'program') and 'id' of the
+    record changed, the 'op' ('create', 'update' or 'delete') and its
+    'time'. A record changed more than once may be listed once only,
+    for its latest change; fetch created and updated records (e.g.,
+    with /programs/JSON?ids=...) for their current data.
+
+    Query args:
+        since (str): Cursor returned by an earlier request; only changes
+            made after it are listed (optional; default: all changes).
+        limit (int): Number of changes per page (optional).
+
+    The 'cursor' member holds the cursor to pass as 'since' next time
+    (unchanged if there are no new changes), and 'next' the URL using
+    it; 'more' is true if further changes are already waiting. If the
+    cursor is invalid, 400 error.
+    """
+    limit = page_size(request.args.get('limit', type=int),
+                      CHANGES_PAGE_SIZE, CHANGES_PAGE_SIZE_MAX)
+    after = 0
+    if request.args.get('since'):
+        try:
+            after, = decode_cursor(request.args['since'], (int,))
+        except ValueError:
+            abort(400)
+        if after < 0:
+            abort(400)
+    changes, more = changes_after(session, after, limit)
+    if changes:
+        after = changes[-1].id
+    cursor = encode_cursor([after])
+    return jsonify(
+        Changes=[{'type': i.kind, 'id': i.record_id, 'op': i.op,
+                  'time': i.time_changed.isoformat()
+                  if i.time_changed else None} for i in changes],
+        cursor=cursor,
+        next=url_for('showChanges', since=cursor,
+                     limit=request.args.get('limit', type=int)),
+        more=more)
+
+
+@app.route('/search/JSON')
+def searchJSON():
+    """Return JSON data representing programs matching search text.
+
+    Accepts the same query args as the search page. Programs are listed
+    best match first, each with its 'rank'; the 'next' member holds the
+    URL of the following page, or null if this is the last page.
+    """
+    q, results, page, limit, more = searchResults()
+    next_url = None
+    if more:
+        next_url = url_for('searchJSON', q=q, page=page + 1,
+                           limit=request.args.get('limit', type=int))
+    programs = [{'name': i.name, 'description': i.description, 'id': i.id,
+                 'yearBegan': i.yearBegan, 'yearEnded': i.yearEnded,
+                 'genre_id': i.genre_id, 'rank': i.rank} for i in results]
+    return jsonify(Programs=programs, next=next_url)
+
+
+@app.route('/stats/JSON')
+def showStatsJSON():
+    """Return JSON data representing catalog statistics (see /stats)."""
+    return jsonify(catalogStats())
+
+
+@app.route('/metrics')
+def showMetrics():
+    """Return request, query and cache metrics in Prometheus text format."""
+    return Response(metrics.render(),
+                    mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,210 @@
+"""assets.py: Fingerprinted, precompressed static assets.
+
+"python manage.py build-assets" copies every file in the static folder
+to static/build/ under a name which includes a hash of its content
+(e.g., style.3b1f0c2d9e4a.css), writes gzip (and, if the brotli module
+is installed, brotli) compressed copies of text assets beside it, and
+writes a manifest of original and fingerprinted names. url() references
+in stylesheets are rewritten to the fingerprinted names.
+
+Once the manifest is loaded, url_for('static', ...) links to the
+fingerprinted files, which are served in the best encoding the client
+accepts and cached by browsers for a year: a changed file gets a new
+name, so a cached copy never needs revalidating.
+"""
+
+from flask import request, send_from_directory
+from io import BytesIO
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Subdirectory of the static folder which holds the built assets.
+BUILD_DIR = 'build'
+MANIFEST = 'manifest.json'
+
+# Extensions of assets worth compressing (images are already compressed).
+COMPRESSIBLE = ('.css', '.js', '.json', '.svg', '.txt', '.html', '.map')
+
+# Cache-Control value for fingerprinted assets.
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# url(...) references in stylesheets.
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")\s]+)\1\s*\)''')
+
+
+def _fingerprinted(path, data):
+    """Return 'path' with a hash of 'data' inserted before its extension."""
+    name, ext = posixpath.splitext(path)
+    return '%s.%s%s' % (name, hashlib.sha1(data).hexdigest()[:12], ext)
+
+
+def _gzip(data):
+    """Return 'data' gzip compressed (reproducibly, with no timestamp)."""
+    out = BytesIO()
+    with gzip.GzipFile(filename='', mode='wb', fileobj=out,
+                       compresslevel=9, mtime=0) as f:
+        f.write(data)
+    return out.getvalue()
+
+
+ENCODERS = [('gzip', '.gz', _gzip)]
+if brotli is not None:
+    ENCODERS.insert(0, ('br', '.br', brotli.compress))
+
+
+def _rewrite_css(data, path, manifest):
+    """Point url() references in stylesheet 'data' at built assets.
+
+    Args:
+        path (str): Path of the stylesheet, relative to the static
+            folder.
+        manifest (dict): Built paths of the assets built so far.
+    """
+    directory = posixpath.dirname(path)
+
+    def replace(match):
+        url = match.group(2)
+        target = posixpath.normpath(posixpath.join(directory, url))
+        if ':' in url or url.startswith('/') or target not in manifest:
+            return match.group(0)
+        # The stylesheet is built into the same relative directory.
+        built = posixpath.relpath(manifest[target],
+                                  posixpath.join(BUILD_DIR, directory))
+        return 'url(%s%s%s)' % (match.group(1), built, match.group(1))
+    return CSS_URL.sub(replace, data.decode('utf-8')).encode('utf-8')
+
+
+def build(static_folder):
+    """Build fingerprinted and compressed copies of the static assets.
+
+    Assets from earlier builds are left in place, so that pages which
+    still link to them keep working.
+
+    Args:
+        static_folder (str): Path of the app's static folder.
+
+    Returns:
+        dict: The manifest: built path (relative to the static folder)
+        of each asset, keyed by its original path.
+    """
+    sources = []
+    for directory, dirs, files in os.walk(static_folder):
+        rel = os.path.relpath(directory, static_folder)
+        if rel == BUILD_DIR:
+            dirs[:] = []
+            continue
+        sources.extend(posixpath.normpath(posixpath.join(
+                           rel.replace(os.sep, '/'), name))
+                       for name in files)
+    # Build stylesheets last, so that their references can be rewritten.
+    sources.sort(key=lambda path: (path.endswith('.css'), path))
+    manifest = {}
+    for path in sources:
+        with open(os.path.join(static_folder, path), 'rb') as f:
+            data = f.read()
+        if path.endswith('.css'):
+            data = _rewrite_css(data, path, manifest)
+        built = posixpath.join(BUILD_DIR, _fingerprinted(path, data))
+        out = os.path.join(static_folder, built)
+        if not os.path.isdir(os.path.dirname(out)):
+            os.makedirs(os.path.dirname(out))
+        variants = [('', data)]
+        if posixpath.splitext(path)[1] in COMPRESSIBLE:
+            variants.extend((suffix, encode(data))
+                            for name, suffix, encode in ENCODERS)
+        for suffix, content in variants:
+            if suffix and len(content) >= len(data):
+                continue
+            with open(out + suffix, 'wb') as f:
+                f.write(content)
+        manifest[path] = built
+    path = os.path.join(static_folder, BUILD_DIR, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.rename(path + '.tmp', path)
+    return manifest
+
+
+class Assets(object):
+    """Links to and serves an app's built static assets.
+
+    Usage:
+        assets = Assets()
+        assets.install(app)
+        assets.load()  # after "manage.py build-assets"
+
+    Until a manifest is loaded (or if there is none), static files are
+    linked and served as usual.
+    """
+
+    def __init__(self):
+        self.manifest = {}
+        self._encodings = {}
+        self._app = None
+
+    def install(self, app):
+        """Rewrite 'app's static URLs and take over its static route."""
+        self._app = app
+        self._send_static = app.view_functions['static']
+        app.view_functions['static'] = self.send
+        app.url_defaults(self._url_defaults)
+
+    def load(self):
+        """Load the manifest written by build(), if there is one."""
+        folder = self._app.static_folder
+        try:
+            with open(os.path.join(folder, BUILD_DIR, MANIFEST)) as f:
+                manifest = json.load(f)
+        except IOError:
+            manifest = {}
+        encodings = {}
+        for built in manifest.values():
+            encodings[built] = [
+                (name, suffix) for name, suffix, encode in ENCODERS
+                if os.path.exists(os.path.join(folder, built + suffix))]
+        self.manifest = manifest
+        self._encodings = encodings
+
+    def _url_defaults(self, endpoint, values):
+        if endpoint == 'static':
+            filename = values.get('filename')
+            if filename in self.manifest:
+                values['filename'] = self.manifest[filename]
+
+    def send(self, filename):
+        """Serve static file 'filename'.
+
+        Built assets are served compressed if the client accepts it,
+        with headers letting browsers cache them indefinitely.
+        """
+        encodings = self._encodings.get(filename)
+        if encodings is None:
+            return self._send_static(filename=filename)
+        mimetype = (mimetypes.guess_type(filename)[0] or
+                    'application/octet-stream')
+        encoding, suffix = None, ''
+        for name, variant in encodings:
+            if request.accept_encodings[name]:
+                encoding, suffix = name, variant
+                break
+        response = send_from_directory(self._app.static_folder,
+                                       filename + suffix,
+                                       mimetype=mimetype)
+        response.headers['Cache-Control'] = IMMUTABLE
+        if encodings:
+            response.vary.add('Accept-Encoding')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,110 @@
+"""background.py: Debounced background refresh of derived data.
+
+A BackgroundRefresh subclass implements refresh(), which recomputes
+something derived from the catalog (e.g., the catalog snapshot). A
+background thread calls it 'delay' seconds after changed() is first
+called, so that a burst of writes costs one refresh, and otherwise
+every 'interval' seconds, so that writes made by other processes (e.g.,
+other mod_wsgi daemons) are picked up too.
+"""
+
+import atexit
+import logging
+import threading
+import time
+
+
+log = logging.getLogger(__name__)
+
+
+class BackgroundRefresh(object):
+    """Calls refresh() in a background thread after writes.
+
+    Attributes:
+        builds (int): Refreshes which rebuilt the derived data.
+        failures (int): Refreshes which raised an exception.
+    """
+
+    # Name of the background thread.
+    name = 'background-refresh'
+
+    def __init__(self, delay=1.0, interval=5.0):
+        """Args:
+            delay (float): Seconds from a write to the refresh.
+            interval (float): Seconds between periodic refreshes.
+        """
+        self.delay = delay
+        self.interval = interval
+        self.builds = 0
+        self.failures = 0
+        self._due = None
+        self._stopped = False
+        self._cond = threading.Condition(threading.Lock())
+        self._thread = None
+
+    def start(self):
+        """Start the refresh thread if not yet running in this process.
+
+        The thread is started on first use rather than at import so
+        that each forked worker process gets its own.
+        """
+        with self._cond:
+            if self._stopped:
+                return
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._work,
+                                                name=self.name)
+                self._thread.daemon = True
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def changed(self):
+        """Schedule a refresh after a catalog write."""
+        self._schedule(self.delay)
+
+    def _schedule(self, delay):
+        self.start()
+        with self._cond:
+            due = time.time() + delay
+            if self._due is None or due < self._due:
+                self._due = due
+                self._cond.notify()
+
+    def stop(self, timeout=1.0):
+        """Stop the refresh thread, waiting up to 'timeout' seconds."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def refresh(self, force=False):
+        """Recompute the derived data if it is out of date.
+
+        Args:
+            force (bool): True if called after a write, in which case
+                the data should be recomputed even if it appears
+                current.
+        """
+        raise NotImplementedError
+
+    def _work(self):
+        while True:
+            with self._cond:
+                if self._due is None and not self._stopped:
+                    self._cond.wait(self.interval)
+                if self._stopped:
+                    return
+                due = self._due
+                if due is not None:
+                    wait = due - time.time()
+                    if wait > 0:
+                        self._cond.wait(wait)
+                        continue
+                    self._due = None
+            try:
+                self.refresh(force=due is not None)
+            except Exception:
+                self.failures += 1
+                log.exception('Background refresh (%s) failed.', self.name)
@@ -0,0 +1,384 @@
+#!/usr/bin/env python
+
+"""benchmark.py: Endpoint benchmarks for 'OTR Program Catalog'.
+
+Seeds a synthetic catalog of configurable size into a local database,
+then drives every route in-process through Flask's test client (logged-in
+routes with a stubbed login session) and reports throughput and latency
+percentiles per route. Results are written as JSON so that runs from
+different commits can be compared.
+
+Usage:
+    python benchmark.py [--db-url URL] [--genres N] [--programs N]
+                        [--users N] [--requests N] [--output FILE]
+                        [--accept-encoding ENC] [--startup-runs N]
+                        [--read-model FILE]
+                        [--compare FILE]
+
+For example, to benchmark against a SQLite stand-in and compare with a
+previous run:
+    python benchmark.py --programs 100000 --output after.json \\
+        --compare before.json
+"""
+
+from timeit import default_timer as timer
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+
+
+WORDS = ('mystery detective comedy western drama family quiz music '
+         'adventure sheriff radio theater hour presents starring '
+         'weekly broadcast network sponsor episode serial').split()
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Benchmark app endpoints.')
+    parser.add_argument('--db-url', default='sqlite:////tmp/otr_bench.db',
+                        help='database to seed and benchmark against '
+                             '(default: %(default)s)')
+    parser.add_argument('--genres', type=int, default=50,
+                        help='number of genres to seed (default: 50)')
+    parser.add_argument('--programs', type=int, default=100000,
+                        help='number of programs to seed '
+                             '(default: 100000)')
+    parser.add_argument('--users', type=int, default=100,
+                        help='number of users to seed (default: 100)')
+    parser.add_argument('--requests', type=int, default=200,
+                        help='requests per route (default: 200)')
+    parser.add_argument('--reseed', action='store_true',
+                        help='reseed even if the catalog is already seeded')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='random seed (default: 1)')
+    parser.add_argument('--output', default='bench_output.json',
+                        help='results file (default: %(default)s)')
+    parser.add_argument('--accept-encoding', default='',
+                        help='Accept-Encoding header to send, e.g. gzip '
+                             '(default: none)')
+    parser.add_argument('--read-model', metavar='FILE',
+                        help='serve genre lists and pages from a read '
+                             'model file (default: none)')
+    parser.add_argument('--startup-runs', type=int, default=5,
+                        help='cold starts to time (default: 5)')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='results file of an earlier run to compare '
+                             'against')
+    return parser.parse_args(argv)
+
+
+def seed_catalog(session, genres, programs, users):
+    """Fill the database with a synthetic catalog.
+
+    Existing catalog data is deleted first. Rows are inserted through the
+    models' tables in batches, then genres' program counts and the
+    catalog statistics are computed and the change log is filled.
+    """
+    from models import User, Genre, Program, CatalogChange
+    from program_counts import recount
+    from catalog_stats import rebuild
+    from change_feed import backfill
+    for model in (CatalogChange, Program, Genre, User):
+        session.execute(model.__table__.delete())
+    session.execute(User.__table__.insert(), [
+        dict(id=i, username='User %d' % i, email='user%d@example.com' % i)
+        for i in range(1, users + 1)])
+    session.execute(Genre.__table__.insert(), [
+        dict(id=i, name='Genre %d' % i, user_id=random.randint(1, users))
+        for i in range(1, genres + 1)])
+    batch = []
+    for i in range(1, programs + 1):
+        began = random.randint(1920, 1980)
+        batch.append(dict(
+            id=i, name='Program %d' % i,
+            description=' '.join(random.choice(WORDS) for w in range(30)),
+            yearBegan=began, yearEnded=random.randint(began, 1980),
+            genre_id=random.randint(1, genres),
+            user_id=random.randint(1, users)))
+        if len(batch) == 5000:
+            session.execute(Program.__table__.insert(), batch)
+            batch = []
+    if batch:
+        session.execute(Program.__table__.insert(), batch)
+    recount(session)
+    rebuild(session)
+    backfill(session)
+    session.commit()
+
+
+def login(client, user_id):
+    """Stub a logged-in session for 'user_id' in test 'client'."""
+    with client.session_transaction() as login_session:
+        login_session['user_name'] = 'User %d' % user_id
+        login_session['user_id'] = user_id
+        login_session['email'] = 'user%d@example.com' % user_id
+        login_session['provider'] = 'google'
+
+
+def percentile(values, p):
+    """Return the 'p'th percentile (nearest rank) of sorted 'values'."""
+    if not values:
+        return None
+    rank = int(round(p / 100.0 * len(values) + 0.5)) - 1
+    return values[max(0, min(rank, len(values) - 1))]
+
+
+def milliseconds(seconds):
+    """Return 'seconds' in milliseconds, rounded (None for None)."""
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+def run_route(client, requests):
+    """Issue (method, url, data) 'requests' and return their statistics.
+
+    Returns:
+        tuple: (stats dict, list of responses)
+    """
+    times = []
+    statuses = {}
+    responses = []
+    start = timer()
+    for method, url, data in requests:
+        t = timer()
+        response = client.open(url, method=method, data=data)
+        response.get_data()
+        times.append(timer() - t)
+        statuses[response.status_code] = (
+            statuses.get(response.status_code, 0) + 1)
+        responses.append(response)
+    elapsed = timer() - start
+    times.sort()
+    return {
+        'requests': len(times),
+        'throughput': round(len(times) / elapsed, 1) if elapsed else None,
+        'mean_ms': milliseconds(sum(times) / len(times)) if times else None,
+        'p50_ms': milliseconds(percentile(times, 50)),
+        'p95_ms': milliseconds(percentile(times, 95)),
+        'p99_ms': milliseconds(percentile(times, 99)),
+        'statuses': dict((str(k), v) for k, v in statuses.items()),
+    }, responses
+
+
+def created_id(response):
+    """Return the id at the end of a post-create redirect location."""
+    parts = response.headers['Location'].rstrip('/').split('/')
+    for part in reversed(parts):
+        if part.isdigit():
+            return int(part)
+
+
+def benchmark(app, session, n, accept_encoding=''):
+    """Drive every route 'n' times and return statistics per route.
+
+    Requests are sent with Accept-Encoding 'accept_encoding', if given.
+    """
+    from models import Genre, Program
+    genre_ids = [i for (i,) in session.query(Genre.id)]
+    programs = session.query(Program.id, Program.genre_id).order_by(
+        Program.id).limit(10000).all()
+    session.remove()
+    user_id = 1
+    run = datetime.datetime.utcnow().strftime('%Y%m%d%H%M%S')
+    client = app.test_client()
+    if accept_encoding:
+        client.environ_base['HTTP_ACCEPT_ENCODING'] = accept_encoding
+    results = {}
+
+    def pick():
+        return random.choice(programs)
+
+    reads = [
+        ('latestPrograms', lambda i: ('GET', '/', None)),
+        ('showGenre', lambda i: (
+            'GET', '/genre/%d' % random.choice(genre_ids), None)),
+        ('showProgram', lambda i: (
+            'GET', '/genre/%d/program/%d/show' % pick()[::-1], None)),
+        ('showGenresJSON', lambda i: ('GET', '/genres/JSON', None)),
+        ('showGenreProgramsJSON', lambda i: (
+            'GET', '/genre/%d/programs/JSON' % random.choice(genre_ids),
+            None)),
+        ('showProgramJSON', lambda i: (
+            'GET', '/genre/%d/program/%d/JSON' % pick()[::-1], None)),
+        ('searchJSON', lambda i: (
+            'GET', '/search/JSON?q=%s' % random.choice(WORDS), None)),
+        ('showStats', lambda i: ('GET', '/stats', None)),
+        ('showStatsJSON', lambda i: ('GET', '/stats/JSON', None)),
+        ('showChanges', lambda i: ('GET', '/changes', None)),
+        ('showCatalogJSON', lambda i: ('GET', '/catalog/JSON', None)),
+        ('suggestPrograms', lambda i: (
+            'GET', '/programs/suggest?q=program+%d' % random.randint(1, 99),
+            None)),
+    ]
+    for name, make in reads:
+        results[name], responses = run_route(
+            client, [make(i) for i in range(n)])
+
+    login(client, user_id)
+    genre_id = random.choice(genre_ids)
+    results['addGenre'], responses = run_route(client, [
+        ('POST', '/genre/add', {'name': 'Bench Genre %s-%d' % (run, i)})
+        for i in range(n)])
+    new_genres = [created_id(r) for r in responses if r.status_code == 302]
+    results['editGenre'], responses = run_route(client, [
+        ('POST', '/genre/%d/edit' % g, {'name': 'Bench Edited %s-%d' % (
+            run, g)}) for g in new_genres])
+    results['addProgram'], responses = run_route(client, [
+        ('POST', '/genre/%d/program/add' % genre_id, {
+            'name': 'Bench Program %s-%d' % (run, i), 'yearBegan': '1940',
+            'yearEnded': '1950', 'description': 'Benchmark program.'})
+        for i in range(n)])
+    new_programs = [created_id(r) for r in responses if r.status_code == 302]
+    results['editProgram'], responses = run_route(client, [
+        ('POST', '/genre/%d/program/%d/edit' % (genre_id, p), {
+            'name': 'Bench Edited %s-%d' % (run, p), 'yearBegan': '1941',
+            'yearEnded': '1951', 'description': 'Edited.'})
+        for p in new_programs])
+    results['deleteProgram'], responses = run_route(client, [
+        ('POST', '/genre/%d/program/%d/delete' % (genre_id, p), None)
+        for p in new_programs])
+    results['deleteGenre'], responses = run_route(client, [
+        ('POST', '/genre/%d/delete' % g, None) for g in new_genres])
+    return results
+
+
+# Run in a fresh interpreter to time a cold start of the app.
+STARTUP_SCRIPT = """
+import json, sys
+from timeit import default_timer as timer
+start = timer()
+from application import create_app
+app = create_app({'DATABASE_URL': sys.argv[1], 'SECRET_KEY': 'benchmark',
+                  'TEMPLATE_CACHE_DIR': sys.argv[2] or None})
+started = timer()
+app.test_client().get('/').get_data()
+print json.dumps({'startup': started - start,
+                  'first_request': timer() - started})
+"""
+
+
+def startup_times(db_url, runs, template_cache_dir=None):
+    """Time 'runs' cold starts of the app, each in a new process.
+
+    Args:
+        template_cache_dir (str): Compiled template cache directory, or
+            None to compile templates on first use.
+
+    Returns:
+        dict: Median seconds to import and configure the app
+        ('startup_s') and to serve its first request ('first_request_s').
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    for i in range(runs):
+        output = subprocess.check_output(
+            [sys.executable, '-c', STARTUP_SCRIPT, db_url,
+             template_cache_dir or ''], cwd=here)
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    def median(key):
+        return round(sorted(x[key] for x in samples)[runs // 2], 4)
+    return {'runs': runs, 'startup_s': median('startup'),
+            'first_request_s': median('first_request')}
+
+
+def git_commit():
+    """Return the current git commit hash, or None."""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Print p50/p95 latency of 'results' relative to 'baseline'."""
+    print '%-24s %12s %12s %12s %12s' % ('route', 'p50 ms', 'vs base',
+                                         'p95 ms', 'vs base')
+    for name, stats in sorted(results['routes'].items()):
+        base = baseline['routes'].get(name)
+        row = [name, stats['p50_ms'], '', stats['p95_ms'], '']
+        if base and base['p50_ms'] and base['p95_ms']:
+            row[2] = '%+.1f%%' % ((stats['p50_ms'] / base['p50_ms'] - 1)
+                                  * 100)
+            row[4] = '%+.1f%%' % ((stats['p95_ms'] / base['p95_ms'] - 1)
+                                  * 100)
+        print '%-24s %12s %12s %12s %12s' % tuple(row)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    random.seed(args.seed)
+    from application import create_app, session, read_model_writer
+    from database import db
+    from models import Program
+    import template_cache
+    # Requests all come from one client, so rate limits are lifted.
+    app = create_app({'DATABASE_URL': args.db_url,
+                      'SECRET_KEY': 'benchmark', 'RATE_LIMITS': {},
+                      'READ_MODEL_PATH': args.read_model})
+    db.create_schema()
+
+    if args.reseed or session.query(Program).count() != args.programs:
+        start = timer()
+        seed_catalog(session, args.genres, args.programs, args.users)
+        print 'Seeded catalog in %.1fs' % (timer() - start)
+    session.remove()
+    if args.read_model:
+        read_model_writer.refresh()
+
+    results = {
+        'commit': git_commit(),
+        'time': datetime.datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'database': args.db_url.split(':', 1)[0],
+        'catalog': {'genres': args.genres, 'programs': args.programs,
+                    'users': args.users},
+        'accept_encoding': args.accept_encoding,
+        'read_model': bool(args.read_model),
+        'routes': benchmark(app, session, args.requests,
+                            args.accept_encoding),
+    }
+    if args.startup_runs:
+        # Cold starts with templates compiled on first use, and with a
+        # precompiled template cache (as "manage.py compile-templates").
+        results['startup_no_template_cache'] = startup_times(
+            args.db_url, args.startup_runs)
+        cache_dir = tempfile.mkdtemp()
+        try:
+            template_cache.install(app, cache_dir)
+            template_cache.precompile(app)
+            results['startup'] = startup_times(args.db_url,
+                                               args.startup_runs, cache_dir)
+        finally:
+            shutil.rmtree(cache_dir)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    print '%-24s %10s %10s %10s %10s' % ('route', 'req/s', 'p50 ms',
+                                         'p95 ms', 'p99 ms')
+    for name, stats in sorted(results['routes'].items()):
+        print '%-24s %10s %10s %10s %10s' % (
+            name, stats['throughput'], stats['p50_ms'], stats['p95_ms'],
+            stats['p99_ms'])
+    if 'startup' in results:
+        print 'Cold start: %(startup_s)ss to start, %(first_request_s)ss ' \
+              'for first request' % results['startup']
+        print 'Without template cache: %(startup_s)ss to start, ' \
+              '%(first_request_s)ss for first request' % (
+                  results['startup_no_template_cache'])
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
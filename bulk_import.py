@@ -0,0 +1,204 @@
+"""bulk_import.py: Bulk loading of programs from CSV or JSONL files.
+
+Rows are validated with the same rules the Program model applies, then
+written with one multi-row INSERT per batch rather than one ORM flush
+(and one duplicate check and commit) per program.
+
+Each row must provide 'name', 'yearBegan', 'yearEnded' and 'genre'
+(the genre's name); 'description' is optional.
+"""
+
+from models import Genre, Program
+from program_counts import add_to_counts
+from catalog_stats import add_stats, program_stats
+from change_feed import add_programs_created
+from validation_routines import strIsInt, strLenValid, strIntValid
+
+from collections import Counter
+
+import csv
+import json
+
+
+# Number of rows checked for duplicates and inserted per statement.
+BATCH_SIZE = 1000
+
+# Number of batches written per transaction.
+BATCHES_PER_TRANSACTION = 20
+
+FORMATS = ('csv', 'jsonl')
+
+FIELDS = ('name', 'description', 'genre', 'yearBegan', 'yearEnded')
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, row dict) pairs read from file object 'stream'.
+
+    Args:
+        stream (file): Open CSV or JSONL file.
+        fmt (str): 'csv' (with a header row) or 'jsonl'.
+
+    Raises:
+        ValueError: If 'fmt' is not supported.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_num, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_num, row
+    else:
+        raise ValueError('Unsupported import format: %s' % fmt)
+
+
+def _text(value):
+    """Return 'value' as a stripped unicode string ('' for None)."""
+    if value is None:
+        return u''
+    if isinstance(value, str):
+        value = value.decode('utf-8')
+    return unicode(value).strip()
+
+
+def validate_row(row, genre_ids):
+    """Validate an import row and convert it to program column values.
+
+    Applies the rules of Program.validate_name and
+    Program.validate_yearEndedGTEyearBegan.
+
+    Args:
+        row (dict): Row read from the import file.
+        genre_ids (dict): Genre ids keyed by genre name.
+
+    Returns:
+        tuple: (values, errors) where 'values' is a dict of program
+        column values (None if there were errors) and 'errors' is a list
+        of error messages.
+    """
+    if not isinstance(row, dict):
+        return None, ['Row is not a JSON object.']
+    try:
+        fields = dict((key, _text(row.get(key))) for key in FIELDS)
+    except UnicodeDecodeError:
+        return None, ['Row is not valid UTF-8 text.']
+    errors = []
+    name = fields['name']
+    description = fields['description']
+    genre = fields['genre']
+    if not name:
+        errors.append('Program name missing.')
+    elif not strLenValid(name, 1, 120):
+        errors.append('Program name must be between 1 and 120 characters '
+                      'in length.')
+    if len(description) > 1000:
+        errors.append('Description must be at most 1000 characters.')
+    years = {}
+    for key in ('yearBegan', 'yearEnded'):
+        value = fields[key]
+        if not value:
+            errors.append('{} missing.'.format(key))
+        elif not strIsInt(value) or not strIntValid(value, 1920, 1980):
+            errors.append('{} must be an integer year between 1920 and '
+                          '1980.'.format(key))
+        else:
+            years[key] = int(value)
+    if len(years) == 2 and years['yearEnded'] < years['yearBegan']:
+        errors.append('yearEnded must be greater than or equal to '
+                      'yearBegan.')
+    if genre not in genre_ids:
+        errors.append('Unknown genre "%s".' % genre)
+    if errors:
+        return None, errors
+    return dict(name=name, description=description or None,
+                yearBegan=years['yearBegan'], yearEnded=years['yearEnded'],
+                genre_id=genre_ids[genre]), []
+
+
+def _batches(rows, size):
+    """Yield lists of up to 'size' items from iterable 'rows'."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_programs(session, rows, user_id, batch_size=BATCH_SIZE):
+    """Validate and insert programs from (line number, row) pairs.
+
+    Valid rows are inserted BATCH_SIZE at a time, committing every
+    BATCHES_PER_TRANSACTION batches. Each batch also updates its genres'
+    program counts and the catalog statistics, and logs the programs'
+    creation in the change feed, in the same transaction.
+    Rows naming a program which already exists (in the database or
+    earlier in the file) are rejected.
+
+    Args:
+        session (Session): Database session.
+        rows (iterable): (line number, row dict) pairs, e.g. from
+            read_rows().
+        user_id (int): Id of user to whom the programs are credited.
+        batch_size (int): Number of rows per INSERT statement.
+
+    Returns:
+        dict: Report with number of programs 'inserted' and a list of
+        'errors', each with the 'line' number and its 'errors'.
+    """
+    genre_ids = dict(session.query(Genre.name, Genre.id).all())
+    table = Program.__table__
+    seen = set()
+    inserted = 0
+    report = []
+    pending = 0
+    for batch in _batches(rows, batch_size):
+        valid = []
+        for line_num, row in batch:
+            values, errors = validate_row(row, genre_ids)
+            if not errors and values['name'] in seen:
+                errors = ['Program "%s" appears more than once.'
+                          % values['name']]
+            if errors:
+                report.append({'line': line_num, 'errors': errors})
+                continue
+            seen.add(values['name'])
+            values['user_id'] = user_id
+            valid.append((line_num, values))
+        if not valid:
+            continue
+        names = [values['name'] for line_num, values in valid]
+        existing = session.query(Program.name).filter(
+                                                  Program.name.in_(names))
+        existing = set(name for (name,) in existing)
+        records = []
+        for line_num, values in valid:
+            if values['name'] in existing:
+                report.append({'line': line_num, 'errors': [
+                    'Program "%s" already exists.' % values['name']]})
+            else:
+                records.append(values)
+        if records:
+            session.execute(table.insert(), records)
+            add_to_counts(session, Counter(values['genre_id']
+                                           for values in records))
+            add_stats(session, Counter(
+                key for values in records for key in program_stats(
+                    values['yearBegan'], values['yearEnded'], user_id)))
+            add_programs_created(session, [values['name']
+                                           for values in records])
+            inserted += len(records)
+            pending += 1
+        if pending == BATCHES_PER_TRANSACTION:
+            session.commit()
+            pending = 0
+    session.commit()
+    return {'inserted': inserted, 'errors': report}
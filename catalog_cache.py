@@ -0,0 +1,177 @@
+"""catalog_cache.py: In-process caches for 'OTR Program Catalog' app."""
+
+from collections import OrderedDict
+
+import threading
+import time
+
+
+class GenreCache(object):
+    """Cache of the sorted genre list and the navigation fragments
+    rendered from it.
+
+    The cache is filled on first use and emptied by invalidate(), which
+    the app calls after every committed genre write. Entries also expire
+    after 'ttl' seconds so that processes which did not see a write
+    (e.g., other mod_wsgi daemons) eventually pick it up.
+
+    The loader also returns a version of the list, which get() returns
+    with it, so that an ETag computed from the version describes the
+    cached list rather than the (possibly newer) database.
+
+    Attributes:
+        hits (int): Lookups served from the cache.
+        misses (int): Lookups which had to query the database or
+            render the fragment.
+        generation (int): Number of invalidations so far.
+    """
+
+    def __init__(self, loader, ttl=60):
+        """Args:
+            loader (callable): Returns (genres, version): the sorted
+                list of genres and a tuple of values which change
+                whenever the list does. The version must be read no
+                later than the list.
+            ttl (int): Maximum age of cached entries, in seconds.
+        """
+        self.loader = loader
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._genres = None
+        self._version = None
+        self._fragments = {}
+        self._loaded_at = 0
+
+    def _expired(self):
+        return time.time() - self._loaded_at > self.ttl
+
+    def get(self):
+        """Return the cached (genres, version), loading if necessary.
+
+        A list loaded while invalidate() ran is returned but not stored,
+        since it may predate the write which invalidated the cache.
+        """
+        with self._lock:
+            if self._genres is not None and not self._expired():
+                self.hits += 1
+                return self._genres, self._version
+            self.misses += 1
+            generation = self.generation
+        genres, version = self.loader()
+        with self._lock:
+            if generation == self.generation:
+                self._genres = genres
+                self._version = version
+                self._fragments = {}
+                self._loaded_at = time.time()
+        return genres, version
+
+    def genres(self):
+        """Return the cached genre list, loading it if necessary."""
+        return self.get()[0]
+
+    def fragment(self, key, render):
+        """Return the cached fragment for 'key', rendering it if needed.
+
+        Args:
+            key: Hashable value identifying the variant of the fragment.
+            render (callable): Called with the genre list to produce
+                the fragment.
+        """
+        genres = self.genres()
+        with self._lock:
+            if key in self._fragments:
+                return self._fragments[key]
+        html = render(genres)
+        with self._lock:
+            if self._genres is genres:
+                self._fragments[key] = html
+        return html
+
+    def invalidate(self):
+        """Drop the cached genre list and all rendered fragments."""
+        with self._lock:
+            self.generation += 1
+            self._genres = None
+            self._version = None
+            self._fragments = {}
+
+    def stats(self):
+        """Return hit/miss counters in dictionary form."""
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+class PageCache(object):
+    """Bounded LRU cache of rendered response bodies.
+
+    Entries are evicted least recently used first once 'max_entries' is
+    reached, and expire after 'ttl' seconds so that processes which did
+    not see a write eventually pick it up. invalidate() drops every
+    entry; a response rendered before the invalidation (as identified by
+    the 'generation' it was rendered in) is not stored. Each entry also
+    holds compressed copies of its body, added as clients ask for them,
+    so that a body is compressed once rather than on every hit.
+
+    Attributes:
+        hits (int): Lookups served from the cache.
+        misses (int): Lookups not found in the cache.
+        evictions (int): Entries dropped to make room for new ones.
+    """
+
+    def __init__(self, max_entries=1000, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Return the (body, mimetype, encoded) stored for 'key', or None.
+
+        'encoded' is the entry's dict of compressed bodies keyed by
+        content encoding, to which the caller may add.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or time.time() - entry[2] > self.ttl:
+                self.misses += 1
+                return None
+            # Re-insert to mark the entry as most recently used.
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[0], entry[1], entry[3]
+
+    def set(self, key, body, mimetype, generation):
+        """Store response 'body' and 'mimetype' for 'key'.
+
+        Args:
+            generation (int): Value of the 'generation' attribute read
+                before the response was rendered.
+        """
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries.pop(key, None)
+            while len(self._entries) >= self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._entries[key] = (body, mimetype, time.time(), {})
+
+    def invalidate(self):
+        """Drop all cached responses."""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        """Return cache counters in dictionary form."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions,
+                    'entries': len(self._entries)}
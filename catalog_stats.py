@@ -0,0 +1,117 @@
+"""catalog_stats.py: Incrementally maintained catalog statistics.
+
+The catalog_stat table (see models.CatalogStat) holds one program count
+per statistic: programs on air in each year and each decade, programs
+contributed by each user, and the total. The Program event listeners in
+models.py apply each program write's changes to it; bulk inserts which
+bypass the ORM call add_stats(). Reading every statistic therefore
+takes one query over a row per year, decade and contributing user,
+however many programs the catalog holds. rebuild() recomputes the
+table from the program table.
+"""
+
+from collections import Counter
+
+from sqlalchemy import text
+
+
+# Range of broadcast years accepted by the Program model.
+FIRST_YEAR = 1920
+LAST_YEAR = 1980
+
+UPSERT = text(
+    'INSERT INTO catalog_stat (kind, value, programs) '
+    'VALUES (:kind, :value, :programs) '
+    'ON CONFLICT (kind, value) DO UPDATE '
+    'SET programs = catalog_stat.programs + excluded.programs')
+
+
+def program_stats(yearBegan, yearEnded, user_id):
+    """Return the (kind, value) statistics a program counts towards.
+
+    Args:
+        yearBegan, yearEnded (int or str): Years the program was on air.
+        user_id (int): Id of user who added the program.
+
+    Returns:
+        list: ('year', year) for each year on air, ('decade', first
+        year of decade) for each decade on air, ('user', user_id) and
+        ('total', 0).
+    """
+    began, ended = int(yearBegan), int(yearEnded)
+    keys = [('year', year) for year in range(began, ended + 1)]
+    keys.extend(('decade', decade)
+                for decade in range(began // 10 * 10, ended + 1, 10))
+    if user_id is not None:
+        keys.append(('user', user_id))
+    keys.append(('total', 0))
+    return keys
+
+
+def add_stats(conn, counts):
+    """Add program 'counts' to the catalog statistics.
+
+    Args:
+        conn (Connection or Session): Executes the updates, in its
+            current transaction.
+        counts (dict): Number of programs to add (or, if negative,
+            remove), keyed by (kind, value) as from program_stats().
+    """
+    rows = [{'kind': kind, 'value': value, 'programs': n}
+            for (kind, value), n in counts.items() if n]
+    if rows:
+        conn.execute(UPSERT, rows)
+
+
+def rebuild(conn):
+    """Recompute all catalog statistics from the program table.
+
+    Programs are grouped by (yearBegan, yearEnded, user_id) in the
+    database, so the data read is bounded by the number of distinct
+    year ranges and users rather than by the number of programs.
+
+    Args:
+        conn (Connection or Session): Executes the queries and updates,
+            in its current transaction.
+    """
+    counts = Counter()
+    groups = conn.execute(text(
+        'SELECT "yearBegan", "yearEnded", user_id, count(*) FROM program '
+        'GROUP BY "yearBegan", "yearEnded", user_id'))
+    for yearBegan, yearEnded, user_id, n in groups:
+        for key in program_stats(yearBegan, yearEnded, user_id):
+            counts[key] += n
+    conn.execute(text('DELETE FROM catalog_stat'))
+    add_stats(conn, counts)
+
+
+def create_catalog_stats(engine):
+    """Fill an empty catalog_stat table (e.g., a newly created one)."""
+    with engine.begin() as conn:
+        if conn.execute(text('SELECT 1 FROM catalog_stat')).first() is None:
+            rebuild(conn)
+
+
+def catalog_stats(conn):
+    """Return catalog statistics in dictionary form.
+
+    Returns:
+        dict: 'programs' (the total number), 'years' and 'decades'
+        ((year, number on air) pairs for every year or decade from
+        FIRST_YEAR to LAST_YEAR) and 'users' ((user id, number added)
+        pairs for users who added programs, most programs first).
+    """
+    stats = {'year': {}, 'decade': {}, 'user': {}, 'total': {}}
+    for kind, value, programs in conn.execute(text(
+            'SELECT kind, value, programs FROM catalog_stat')):
+        stats[kind][value] = programs
+    return {
+        'programs': stats['total'].get(0, 0),
+        'years': [(year, stats['year'].get(year, 0))
+                  for year in range(FIRST_YEAR, LAST_YEAR + 1)],
+        'decades': [(decade, stats['decade'].get(decade, 0))
+                    for decade in range(FIRST_YEAR, LAST_YEAR + 1, 10)],
+        'users': sorted(((user_id, n) for user_id, n
+                         in stats['user'].items() if n > 0),
+                        key=lambda item: (-item[1], item[0])),
+    }
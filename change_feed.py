@@ -0,0 +1,153 @@
+"""change_feed.py: Log of catalog changes for incremental sync.
+
+Every genre and program created, updated or deleted through the ORM
+appends a row to the catalog_change table (see models.CatalogChange) in
+the same transaction as the write itself; bulk inserts which bypass the
+ORM call add_programs_created(). Each row's id is its position in the
+feed, and rows for deleted records are kept as tombstones, so a mirror
+which remembers the last id it has seen can fetch everything which has
+changed since with one range scan of the primary key.
+
+On PostgreSQL, writers take a lock on catalog_change before adding to
+it, so ids are allocated in commit order and a reader never sees a
+later id committed before an earlier one.
+"""
+
+from sqlalchemy import DateTime, Integer, String, bindparam, text
+
+
+INSERT = text(
+    'INSERT INTO catalog_change (kind, record_id, op) '
+    'VALUES (:kind, :record_id, :op)')
+
+INSERT_PROGRAMS = text(
+    "INSERT INTO catalog_change (kind, record_id, op) "
+    "SELECT 'program', id, 'create' FROM program WHERE name IN :names "
+    "ORDER BY id").bindparams(bindparam('names', expanding=True))
+
+# Existing records, oldest change first, for a newly created log.
+BACKFILL = text(
+    "INSERT INTO catalog_change (kind, record_id, op, time_changed) "
+    "SELECT kind, id, 'create', changed FROM ("
+    "SELECT 'genre' AS kind, id, "
+    "coalesce(time_updated, time_created) AS changed FROM genre "
+    "UNION ALL "
+    "SELECT 'program' AS kind, id, "
+    "coalesce(time_updated, time_created) AS changed FROM program"
+    ") AS records ORDER BY changed, kind, id")
+
+PAGE = text(
+    'SELECT id, kind, record_id, op, time_changed FROM catalog_change '
+    'WHERE id > :after ORDER BY id LIMIT :limit').columns(
+        id=Integer, kind=String, record_id=Integer, op=String,
+        time_changed=DateTime(timezone=True))
+
+# Rows superseded by a later change to the same record.
+COMPACT = text(
+    'DELETE FROM catalog_change WHERE EXISTS ('
+    'SELECT 1 FROM catalog_change AS later '
+    'WHERE later.kind = catalog_change.kind '
+    'AND later.record_id = catalog_change.record_id '
+    'AND later.id > catalog_change.id)')
+
+
+def _lock(conn):
+    """Serialize writers to the change log until the transaction ends.
+
+    SQLite allows only one writer at a time already.
+    """
+    bind = conn.get_bind() if hasattr(conn, 'get_bind') else conn
+    if bind.dialect.name == 'postgresql':
+        conn.execute(text('LOCK TABLE catalog_change '
+                          'IN SHARE ROW EXCLUSIVE MODE'))
+
+
+def add_change(conn, kind, record_id, op):
+    """Record that a record has been created, updated or deleted.
+
+    Args:
+        conn (Connection or Session): Executes the insert, in its
+            current transaction.
+        kind (str): 'genre' or 'program'.
+        record_id (int): Primary key of the record.
+        op (str): 'create', 'update' or 'delete'.
+    """
+    _lock(conn)
+    conn.execute(INSERT, {'kind': kind, 'record_id': record_id,
+                          'op': op})
+
+
+def add_programs_created(conn, names):
+    """Record the creation of newly inserted programs.
+
+    Args:
+        conn (Connection or Session): Executes the insert, in its
+            current transaction.
+        names (list): Names of the programs inserted.
+    """
+    if names:
+        _lock(conn)
+        conn.execute(INSERT_PROGRAMS, {'names': list(names)})
+
+
+def changes_after(conn, after, limit):
+    """Return one page of changes, oldest first.
+
+    Args:
+        conn (Connection or Session): Executes the query.
+        after (int): Id of the last change already seen (0 for none).
+        limit (int): Maximum number of changes on the page.
+
+    Returns:
+        tuple: (changes, more) where 'changes' is a list of rows with
+        id, kind, record_id, op and time_changed columns, and 'more' is
+        True if further changes follow the page.
+    """
+    rows = conn.execute(PAGE, {'after': after,
+                               'limit': limit + 1}).fetchall()
+    return rows[:limit], len(rows) > limit
+
+
+def latest_change(conn):
+    """Return the id of the latest change (0 if there are none).
+
+    The id changes with every catalog write, so it serves as a version
+    number for the whole catalog.
+    """
+    return conn.execute(text(
+        'SELECT max(id) FROM catalog_change')).scalar() or 0
+
+
+def compact(conn):
+    """Delete changes superseded by later changes to the same record.
+
+    The latest change to each record (a tombstone, for a deleted
+    record) is kept, so a mirror reading the feed from any point still
+    learns the current state of every record changed since.
+
+    Returns:
+        int: Number of changes deleted.
+    """
+    _lock(conn)
+    return conn.execute(COMPACT).rowcount
+
+
+def backfill(conn):
+    """Log every existing genre and program as created.
+
+    Records are logged in order of their time_updated (or, if never
+    updated, time_created).
+
+    Args:
+        conn (Connection or Session): Executes the insert, in its
+            current transaction.
+    """
+    _lock(conn)
+    conn.execute(BACKFILL)
+
+
+def create_change_log(engine):
+    """Fill an empty catalog_change table (e.g., a newly created one)."""
+    with engine.begin() as conn:
+        if conn.execute(text('SELECT 1 FROM catalog_change')).first() is None:
+            backfill(conn)
@@ -0,0 +1,178 @@
+"""compression.py: WSGI middleware compressing HTML and JSON responses.
+
+Responses of a compressible type are compressed with the best encoding
+the client accepts (brotli, if the brotli module is installed, or
+gzip). Responses of known length are compressed in one go, and only if
+they are at least 'min_size' bytes long; streamed responses are
+compressed chunk by chunk as they are sent. Responses which already
+have a Content-Encoding (e.g., precompressed static assets or cached
+compressed pages) are passed through untouched.
+"""
+
+from werkzeug.http import parse_accept_header
+from werkzeug.wsgi import ClosingIterator
+
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Smallest response body (in bytes) worth compressing.
+MIN_SIZE = 500
+
+# Compression levels: fast enough to apply to every dynamic response.
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+COMPRESSIBLE = ('text/html', 'text/plain', 'text/css', 'application/json',
+                'application/x-ndjson', 'application/javascript',
+                'image/svg+xml')
+
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+class _Gzip(object):
+    """Incremental gzip compressor."""
+
+    def __init__(self, level):
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        """Return compressed 'data', flushed so it can be sent now."""
+        return self._z.compress(data) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._z.flush()
+
+
+class _Brotli(object):
+    """Incremental brotli compressor."""
+
+    def __init__(self, quality):
+        self._b = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        """Return compressed 'data', flushed so it can be sent now."""
+        return self._b.process(data) + self._b.flush()
+
+    def finish(self):
+        return self._b.finish()
+
+
+class CompressionMiddleware(object):
+    """Compress responses of WSGI 'app' per the request's Accept-Encoding.
+
+    Usage:
+        app.wsgi_app = CompressionMiddleware(app.wsgi_app)
+    """
+
+    def __init__(self, app, min_size=MIN_SIZE, level=GZIP_LEVEL,
+                 quality=BROTLI_QUALITY, mimetypes=COMPRESSIBLE):
+        """Args:
+            app: WSGI application to wrap.
+            min_size (int): Smallest body compressed, in bytes.
+            level (int): gzip compression level.
+            quality (int): brotli compression quality.
+            mimetypes (tuple): Content types which are compressed.
+        """
+        self.app = app
+        self.min_size = min_size
+        self.level = level
+        self.quality = quality
+        self.mimetypes = mimetypes
+
+    def negotiate(self, accept_encoding):
+        """Return the best encoding for an Accept-Encoding header value.
+
+        Returns:
+            str: 'br' or 'gzip', or None if the client accepts neither.
+        """
+        return parse_accept_header(accept_encoding or '').best_match(
+                                                                 ENCODINGS)
+
+    def compressor(self, encoding):
+        """Return an incremental compressor for 'encoding'."""
+        if encoding == 'br':
+            return _Brotli(self.quality)
+        return _Gzip(self.level)
+
+    def compress(self, data, encoding):
+        """Return 'data' compressed with 'encoding'."""
+        compressor = self.compressor(encoding)
+        return compressor.compress(data) + compressor.finish()
+
+    def _compressible(self, status, headers):
+        """Return True if a response may be compressed.
+
+        Args:
+            status (str): Response status line.
+            headers (dict): Response headers, keyed by lower-case name.
+        """
+        if status[:3] in ('204', '206', '304'):
+            return False
+        if 'content-encoding' in headers or 'content-range' in headers:
+            return False
+        if 'no-transform' in headers.get('cache-control', ''):
+            return False
+        mimetype = headers.get('content-type', '').split(';')[0].strip()
+        if mimetype not in self.mimetypes:
+            return False
+        length = headers.get('content-length')
+        return length is None or int(length) >= self.min_size
+
+    def __call__(self, environ, start_response):
+        encoding = self.negotiate(environ.get('HTTP_ACCEPT_ENCODING'))
+        if encoding is None or environ['REQUEST_METHOD'] == 'HEAD':
+            return self.app(environ, start_response)
+        response = []
+
+        def start(status, headers, exc_info=None):
+            response[:] = [status, headers, exc_info]
+            # The body is sent through the iterable returned below.
+            return lambda data: None
+
+        app_iter = self.app(environ, start)
+        status, headers, exc_info = response
+        names = dict((k.lower(), v) for k, v in headers)
+        if not self._compressible(status, names):
+            start_response(status, headers, exc_info)
+            return app_iter
+        headers = [(k, v) for k, v in headers
+                   if k.lower() not in ('content-length', 'etag', 'vary')]
+        headers.append(('Content-Encoding', encoding))
+        vary = [v.strip() for v in names.get('vary', '').split(',')
+                if v.strip()]
+        if 'accept-encoding' not in [v.lower() for v in vary]:
+            vary.append('Accept-Encoding')
+        headers.append(('Vary', ', '.join(vary)))
+        etag = names.get('etag')
+        if etag:
+            # The compressed body is a different (but equivalent)
+            # representation, so a strong validator becomes a weak one.
+            headers.append(('ETag', etag if etag.startswith('W/')
+                            else 'W/' + etag))
+        if 'content-length' in names:
+            try:
+                body = self.compress(''.join(app_iter), encoding)
+            finally:
+                if hasattr(app_iter, 'close'):
+                    app_iter.close()
+            headers.append(('Content-Length', str(len(body))))
+            start_response(status, headers, exc_info)
+            return [body]
+        start_response(status, headers, exc_info)
+        return ClosingIterator(self._stream(app_iter, encoding),
+                               getattr(app_iter, 'close', None))
+
+    def _stream(self, app_iter, encoding):
+        """Yield chunks of 'app_iter' compressed with 'encoding'."""
+        compressor = self.compressor(encoding)
+        for chunk in app_iter:
+            if chunk:
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+        yield compressor.finish()
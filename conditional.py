@@ -0,0 +1,66 @@
+"""conditional.py: Conditional GET (ETag / Last-Modified) support."""
+
+from flask import request, make_response
+from functools import wraps
+
+import hashlib
+
+
+def version_etag(*parts):
+    """Return an ETag value derived from the request path and 'parts'.
+
+    Args:
+        parts: Values which change whenever the resource changes
+            (e.g., row counts and latest update timestamps).
+    """
+    key = repr((request.full_path,) + parts)
+    return hashlib.sha1(key).hexdigest()
+
+
+def _utc(dt):
+    """Return datetime 'dt' as naive UTC with one-second resolution."""
+    if dt.tzinfo is not None:
+        dt = (dt - dt.utcoffset()).replace(tzinfo=None)
+    return dt.replace(microsecond=0)
+
+
+def conditional_get(version):
+    """Answer conditional GETs for the wrapped view with 304 responses.
+
+    'version' is called with the view's arguments before the view runs
+    and must return an (etag, last_modified) tuple computed without
+    loading any ORM objects. If the request's If-None-Match (or, when
+    absent, If-Modified-Since) header shows that the client's copy is
+    current, a 304 response is returned and the view is not run.
+    Otherwise, the view's response is sent with ETag and Last-Modified
+    headers. Either element of the tuple may be None; if the etag is
+    None the request is passed straight to the view.
+
+    Args:
+        version (callable): Returns (etag, last_modified) for a set of
+            view arguments.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            etag, last_modified = version(*args, **kwargs)
+            if etag is None:
+                return f(*args, **kwargs)
+            if last_modified:
+                last_modified = _utc(last_modified)
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            elif request.if_modified_since and last_modified:
+                not_modified = last_modified <= request.if_modified_since
+            else:
+                not_modified = False
+            if not_modified:
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+            response.set_etag(etag, weak=True)
+            if last_modified:
+                response.last_modified = last_modified
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,242 @@
+"""database.py: Engine and session helpers for 'OTR Program Catalog' app."""
+
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import Session, scoped_session
+from sqlalchemy.pool import QueuePool
+from db_creds import db_creds, db_pool, db_replicas
+from models import Base
+from search import create_search_index
+from program_counts import create_program_count
+from catalog_stats import create_catalog_stats
+from change_feed import create_change_log
+from suggest import create_suggest_index
+
+import os
+import random
+import threading
+
+
+def db_url(creds=db_creds):
+    """Return the SQLAlchemy database URL for the application.
+
+    The OTR_DATABASE_URL environment variable, if set, overrides the
+    URL built from 'creds'. This allows the app to be pointed at a
+    local PostgreSQL or SQLite stand-in (e.g., for load testing).
+
+    Args:
+        creds (dict): Connection string components (see db_creds.py).
+
+    Returns:
+        str: Database URL.
+    """
+    url = os.environ.get('OTR_DATABASE_URL')
+    if url:
+        return url
+    return "{}://{}:{}@{}:{}/{}".format(
+                                        creds['driver'],
+                                        creds['user'],
+                                        creds['passwd'],
+                                        creds['host'],
+                                        creds['port'],
+                                        creds['database'])
+
+
+def replica_urls(replicas=db_replicas):
+    """Return the database URLs of the application's read replicas.
+
+    The OTR_REPLICA_URLS environment variable (a comma-separated list of
+    URLs), if set, overrides 'replicas'.
+
+    Args:
+        replicas (list): Replica database URLs (see db_creds.py).
+
+    Returns:
+        list: Database URLs; empty if there are no replicas.
+    """
+    urls = os.environ.get('OTR_REPLICA_URLS')
+    if urls is not None:
+        return [url.strip() for url in urls.split(',') if url.strip()]
+    return list(replicas)
+
+
+# Pool settings used where 'pool' leaves them out (SQLAlchemy's QueuePool
+# defaults).
+POOL_DEFAULTS = dict(pool_size=5, max_overflow=10)
+
+
+def pool_capacity(pool):
+    """Return the most connections a pool with settings 'pool' opens.
+
+    Returns:
+        int: pool_size + max_overflow, or None if the overflow is
+        unlimited (max_overflow of -1).
+    """
+    pool = dict(POOL_DEFAULTS, **pool)
+    if pool['max_overflow'] < 0:
+        return None
+    return pool['pool_size'] + pool['max_overflow']
+
+
+def make_engine(url, pool=db_pool):
+    """Create an engine with a connection pool sized per 'pool'.
+
+    Args:
+        url (str): Database URL.
+        pool (dict): Pool settings (pool_size, max_overflow,
+            pool_pre_ping, pool_recycle, pool_timeout); POOL_DEFAULTS
+            apply to any left out.
+
+    Returns:
+        Engine: SQLAlchemy engine.
+    """
+    kwargs = dict(POOL_DEFAULTS, **pool)
+    if url.startswith('sqlite'):
+        # SQLite file databases default to a non-queueing pool; use a
+        # QueuePool so the pool settings apply to the stand-in as well.
+        kwargs['poolclass'] = QueuePool
+        kwargs['connect_args'] = {'check_same_thread': False}
+    elif url.startswith('postgresql'):
+        # Send executemany() batches (e.g., bulk imports) as multi-row
+        # INSERT ... VALUES statements instead of one statement per row.
+        kwargs['executemany_mode'] = 'values'
+    return create_engine(url, **kwargs)
+
+
+def create_indexes(engine):
+    """Create the models' indexes missing from existing tables.
+
+    create_all() creates a table's indexes only along with the table, so
+    databases created before an index was added to the models get it
+    here; otherwise, this does nothing.
+    """
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = set(i['name'] for i in inspector.get_indexes(table.name))
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(engine)
+
+
+class RoutingSession(Session):
+    """Session which reads from a replica while 'use_replica' is set.
+
+    Everything else (flushes, and all statements of sessions without
+    'use_replica') goes to the primary engine. A session keeps using
+    the replica it first picked, so each request sees one consistent
+    replica.
+
+    Attributes:
+        use_replica (bool): Send reads to a replica engine, if any.
+    """
+
+    def __init__(self, db, **kwargs):
+        """Args:
+            db (Database): Supplies the primary and replica engines.
+        """
+        Session.__init__(self, **kwargs)
+        self.db = db
+        self.use_replica = False
+        self._replica = None
+
+    def get_bind(self, mapper=None, clause=None):
+        if self.use_replica and not self._flushing:
+            if self._replica is None:
+                self._replica = self.db.replica()
+            if self._replica is not None:
+                return self._replica
+        return self.db.engine
+
+
+class Database(object):
+    """Lazily created engines and a request-scoped session registry.
+
+    The engines (and their connection pools) are not created until the
+    first session is used, so importing the app does not touch the
+    database.
+
+    Attributes:
+        url (str): Primary database URL (default: db_url()).
+        replica_urls (list): Read replica URLs (default:
+            replica_urls()).
+        pool (dict): Pool settings passed to make_engine().
+        session (scoped_session): Thread-local registry of
+            RoutingSession objects. Each request (thread) gets its own
+            session; session.remove() must be called when the request is
+            torn down.
+    """
+
+    def __init__(self, url=None, pool=db_pool, replica_urls=None):
+        self.url = url
+        self.replica_urls = replica_urls
+        self.pool = pool
+        self._engine = None
+        self._replicas = None
+        self._lock = threading.Lock()
+        self.session = scoped_session(lambda: RoutingSession(self))
+
+    def configure(self, url=None, pool=None, replica_urls=None):
+        """Set database URL, pool settings and/or replica URLs.
+
+        Any engines already created are disposed of; new ones are created
+        with the new settings on next use.
+        """
+        with self._lock:
+            if url is not None:
+                self.url = url
+            if pool is not None:
+                self.pool = pool
+            if replica_urls is not None:
+                self.replica_urls = replica_urls
+            for engine in [self._engine] + (self._replicas or []):
+                if engine is not None:
+                    engine.dispose()
+            self._engine = None
+            self._replicas = None
+
+    @property
+    def engine(self):
+        """Return the engine, creating it on first use."""
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._engine = make_engine(self.url or db_url(),
+                                               self.pool)
+        return self._engine
+
+    @property
+    def replicas(self):
+        """Return the replica engines, creating them on first use."""
+        if self._replicas is None:
+            with self._lock:
+                if self._replicas is None:
+                    urls = self.replica_urls
+                    if urls is None:
+                        urls = replica_urls()
+                    self._replicas = [make_engine(url, self.pool)
+                                      for url in urls]
+        return self._replicas
+
+    def replica(self):
+        """Return a randomly chosen replica engine, or None."""
+        replicas = self.replicas
+        return random.choice(replicas) if replicas else None
+
+    def create_schema(self):
+        """Create missing tables, columns and indexes and the search
+        indexes.
+
+        Newly added program counts and catalog statistics are computed
+        from the existing programs, and a new change log starts with
+        the existing genres and programs.
+        """
+        Base.metadata.create_all(self.engine)
+        create_indexes(self.engine)
+        create_program_count(self.engine)
+        create_catalog_stats(self.engine)
+        create_change_log(self.engine)
+        create_search_index(self.engine)
+        create_suggest_index(self.engine)
+
+
+# Database used by the application.
+db = Database()
@@ -9,3 +9,17 @@ db_creds = dict(driver='postgresql',
                 database='otrcatalog',
                 user='catalog',
                 passwd='')
+
+# Connection pool settings for the application's engine. pool_size and
+# max_overflow bound the number of concurrent connections per process,
+# so size them to the number of mod_wsgi threads.
+db_pool = dict(pool_size=10,
+               max_overflow=10,
+               pool_pre_ping=True,
+               pool_recycle=1800,
+               pool_timeout=30)
+
+# Database URLs of read replicas of the above (e.g., PostgreSQL streaming
+# replicas). Read-only requests are spread across them; writes always go
+# to the primary. Leave empty to send everything to the primary.
+db_replicas = []
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+"""fake_google.py: Local stub of the Google OAuth endpoints the app uses.
+
+Serves authorization code exchange, token info, user info and token
+revocation responses so that the login/logout code paths can be
+exercised without contacting Google. Start the stub, then run the app
+with OTR_GOOGLE_API_URL pointing at it:
+
+    python fake_google.py --port 8001
+    OTR_GOOGLE_API_URL=http://localhost:8001 \
+        FLASK_APP="application:create_app({'SECRET_KEY': 'dev'})" flask run
+
+then open /login (which sets the session's state token) and POST any
+authorization code to /gconnect?state=<state> with an X-Requested-With
+header, as the Google sign-in button would.
+
+Any authorization code is accepted, and exchanged for an access token
+equal to the code. Any access token is accepted. Token info reports the
+token as issued to the app's client id for Google user id
+'sub-<token>'. Requests are counted; GET /stats returns the counts in
+JSON form.
+"""
+
+from flask import Flask, jsonify, request
+
+import argparse
+import base64
+import json
+import os
+import random
+import threading
+import time
+
+
+app = Flask(__name__)
+
+# Behavior settings; see command line options.
+settings = dict(delay=0.0, fail_rate=0.0)
+
+counts = {}
+counts_lock = threading.Lock()
+
+CLIENT_ID = json.loads(open(os.path.join(os.path.dirname(__file__),
+                                         'client_secrets.json')
+                            ).read())['web']['client_id']
+
+
+@app.before_request
+def simulate_conditions():
+    """Count the request and apply configured delay and failure rate."""
+    with counts_lock:
+        counts[request.path] = counts.get(request.path, 0) + 1
+    if request.path == '/stats':
+        return None
+    if settings['delay']:
+        time.sleep(settings['delay'])
+    if random.random() < settings['fail_rate']:
+        return jsonify(error='backend_error'), 503
+
+
+def _jwt(claims):
+    """Return an (unsigned) JWT holding 'claims'."""
+    def encode(value):
+        return base64.urlsafe_b64encode(json.dumps(value)).rstrip('=')
+    return '.'.join([encode({'alg': 'none'}), encode(claims), ''])
+
+
+@app.route('/token', methods=['POST'])
+def token():
+    code = request.form.get('code')
+    if request.form.get('client_id') != CLIENT_ID:
+        return jsonify(error='invalid_client'), 401
+    if not code or request.form.get('grant_type') != 'authorization_code':
+        return jsonify(error='invalid_grant'), 400
+    now = int(time.time())
+    id_token = _jwt(dict(iss='accounts.google.com', aud=CLIENT_ID,
+                         sub='sub-%s' % code, email='%s@example.com' % code,
+                         iat=now, exp=now + 3600))
+    return jsonify(access_token=code, token_type='Bearer', expires_in=3600,
+                   id_token=id_token)
+
+
+@app.route('/oauth2/v1/tokeninfo')
+def tokeninfo():
+    token = request.args.get('access_token', '')
+    return jsonify(issued_to=CLIENT_ID, audience=CLIENT_ID,
+                   user_id='sub-%s' % token, expires_in=3600,
+                   access_type='online')
+
+
+@app.route('/oauth2/v1/userinfo')
+def userinfo():
+    token = request.args.get('access_token', '')
+    return jsonify(id='sub-%s' % token, name='Test User %s' % token,
+                   picture='http://localhost/picture.png',
+                   email='%s@example.com' % token)
+
+
+@app.route('/o/oauth2/revoke')
+def revoke():
+    if not request.args.get('token'):
+        return jsonify(error='invalid_token'), 400
+    return jsonify({})
+
+
+@app.route('/stats')
+def stats():
+    with counts_lock:
+        return jsonify(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stub Google OAuth API.')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--delay', type=float, default=0.0,
+                        help='seconds to wait before each response')
+    parser.add_argument('--fail-rate', type=float, default=0.0,
+                        help='fraction of requests answered with 503')
+    args = parser.parse_args()
+    settings['delay'] = args.delay
+    settings['fail_rate'] = args.fail_rate
+    app.run(port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""google_client.py: Shared HTTP client for Google OAuth API calls.
+
+All calls to Google made while logging users in and out (including the
+authorization code exchange, which oauth2client makes through the
+client's request() method) go through one keep-alive connection pool
+with connect/read timeouts and retries, so a login costs no fresh TLS
+handshakes once the pool is warm and a slow Google endpoint cannot hang
+a worker indefinitely. Token info results are cached briefly by access
+token.
+
+The OTR_GOOGLE_API_URL environment variable, if set, replaces the Google
+hosts with a base URL (e.g., http://localhost:8001 for the stub server
+in fake_google.py).
+"""
+
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+import httplib2
+import os
+import requests
+import threading
+import time
+
+
+GOOGLE_URLS = dict(
+    token='https://oauth2.googleapis.com/token',
+    tokeninfo='https://www.googleapis.com/oauth2/v1/tokeninfo',
+    userinfo='https://www.googleapis.com/oauth2/v1/userinfo',
+    revoke='https://accounts.google.com/o/oauth2/revoke')
+
+# Paths of the above, relative to OTR_GOOGLE_API_URL.
+STUB_PATHS = dict(token='/token',
+                  tokeninfo='/oauth2/v1/tokeninfo',
+                  userinfo='/oauth2/v1/userinfo',
+                  revoke='/o/oauth2/revoke')
+
+
+def google_urls():
+    """Return Google API URLs, honoring OTR_GOOGLE_API_URL if set."""
+    base = os.environ.get('OTR_GOOGLE_API_URL')
+    if not base:
+        return dict(GOOGLE_URLS)
+    return dict((k, base.rstrip('/') + v) for k, v in STUB_PATHS.items())
+
+
+class GoogleClient(object):
+    """Pooled, timeout-bounded client for Google's OAuth endpoints.
+
+    Attributes:
+        urls (dict): Endpoint URLs keyed by 'token', 'tokeninfo',
+            'userinfo' and 'revoke'.
+        timeout (tuple): (connect, read) timeouts in seconds.
+        tokeninfo_hits (int): Token info lookups served from the cache.
+        tokeninfo_misses (int): Token info lookups sent to Google.
+    """
+
+    def __init__(self, urls=None, timeout=(3.05, 10), retries=2,
+                 pool_size=10, tokeninfo_ttl=60, tokeninfo_max=1000):
+        """Args:
+            urls (dict): Endpoint URLs (default: google_urls()).
+            timeout (tuple): (connect, read) timeouts in seconds.
+            retries (int): Retries for failed connections and 5xx
+                responses, with exponential backoff.
+            pool_size (int): Keep-alive connections kept per host.
+            tokeninfo_ttl (int): Seconds to cache token info results.
+            tokeninfo_max (int): Maximum number of cached results.
+        """
+        self.urls = urls or google_urls()
+        self.timeout = timeout
+        self.tokeninfo_ttl = tokeninfo_ttl
+        self.tokeninfo_max = tokeninfo_max
+        self.tokeninfo_hits = 0
+        self.tokeninfo_misses = 0
+        self._tokeninfo = {}
+        self._lock = threading.Lock()
+        retry = Retry(total=retries, backoff_factor=0.2,
+                      status_forcelist=(500, 502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size, max_retries=retry)
+        self.http = requests.Session()
+        self.http.mount('https://', adapter)
+        self.http.mount('http://', adapter)
+
+    def get(self, name, params):
+        """Send GET request to endpoint 'name' and return the response.
+
+        Raises:
+            requests.RequestException: If the request fails or times
+                out after all retries.
+        """
+        return self.http.get(self.urls[name], params=params,
+                             timeout=self.timeout)
+
+    def request(self, uri, method='GET', body=None, headers=None,
+                **kwargs):
+        """Send a request the way httplib2.Http.request() does.
+
+        Lets oauth2client (e.g., OAuth2WebServerFlow.step2_exchange(),
+        given the client as its 'http' argument) use the pool.
+
+        Returns:
+            tuple: (httplib2.Response, content).
+
+        Raises:
+            requests.RequestException: If the request fails.
+        """
+        response = self.http.request(method, uri, data=body,
+                                     headers=headers, timeout=self.timeout)
+        info = dict(response.headers)
+        info['status'] = response.status_code
+        return httplib2.Response(info), response.content
+
+    def tokeninfo(self, access_token):
+        """Return Google's token info (as a dict) for 'access_token'.
+
+        Successful results are cached for tokeninfo_ttl seconds (or until
+        the token expires, if sooner); error results are not cached.
+
+        Raises:
+            requests.RequestException: If the request fails.
+            ValueError: If the response is not JSON.
+        """
+        now = time.time()
+        with self._lock:
+            cached = self._tokeninfo.get(access_token)
+            if cached is not None and cached[0] > now:
+                self.tokeninfo_hits += 1
+                return cached[1]
+            self.tokeninfo_misses += 1
+        result = self.get('tokeninfo', {'access_token': access_token}).json()
+        if result.get('error') is None:
+            ttl = min(self.tokeninfo_ttl,
+                      int(result.get('expires_in', self.tokeninfo_ttl)))
+            with self._lock:
+                if len(self._tokeninfo) >= self.tokeninfo_max:
+                    self._tokeninfo = dict(
+                        (k, v) for k, v in self._tokeninfo.items()
+                        if v[0] > now)
+                if len(self._tokeninfo) < self.tokeninfo_max:
+                    self._tokeninfo[access_token] = (now + ttl, result)
+        return result
+
+    def userinfo(self, access_token):
+        """Return Google's user info (as a dict) for 'access_token'.
+
+        Raises:
+            requests.RequestException: If the request fails.
+            ValueError: If the response is not JSON.
+        """
+        return self.get('userinfo', {'access_token': access_token,
+                                     'alt': 'json'}).json()
+
+    def revoke_status(self, access_token):
+        """Revoke 'access_token'; return the HTTP status of the response.
+
+        Raises:
+            requests.RequestException: If the request fails.
+        """
+        with self._lock:
+            self._tokeninfo.pop(access_token, None)
+        return self.get('revoke', {'token': access_token}).status_code
+
+    def revoke(self, access_token):
+        """Revoke 'access_token'; return True if Google accepted it.
+
+        Raises:
+            requests.RequestException: If the request fails.
+        """
+        return self.revoke_status(access_token) == 200
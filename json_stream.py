@@ -0,0 +1,92 @@
+"""json_stream.py: Incremental JSON/NDJSON encoders for large exports.
+
+Each function is a generator yielding chunks of the encoded document, so
+a response built from it never holds the full result set in memory when
+fed from a 'yield_per' query.
+"""
+
+import json
+
+
+def buffered(chunks, size=65536):
+    """Coalesce small 'chunks' into strings of about 'size' characters.
+
+    Avoids one socket write per record when a server flushes each chunk
+    of a streamed response.
+    """
+    buf = []
+    length = 0
+    for chunk in chunks:
+        buf.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(buf)
+            buf = []
+            length = 0
+    if buf:
+        yield ''.join(buf)
+
+
+def json_list(key, items):
+    """Yield a JSON object with a single list member, one item at a time.
+
+    Args:
+        key (str): Name of the list member (e.g., 'Programs').
+        items (iterable): Serializable items of the list.
+    """
+    yield '{%s: [' % json.dumps(key)
+    sep = ''
+    for item in items:
+        yield sep + json.dumps(item)
+        sep = ', '
+    yield ']}'
+
+
+def ndjson(items):
+    """Yield each item as one line of newline-delimited JSON."""
+    for item in items:
+        yield json.dumps(item) + '\n'
+
+
+def catalog_json(rows):
+    """Yield the full catalog as JSON, nesting programs within genres.
+
+    Args:
+        rows (iterable): (genre, program) pairs ordered by genre, with
+            program None for a genre which contains no programs.
+    """
+    yield '{"Genres": ['
+    current = None
+    for genre, program in rows:
+        if genre.id != current:
+            if current is not None:
+                yield ']}, '
+            current = genre.id
+            # Leave the genre object open to nest its program list.
+            yield json.dumps(genre.serialize)[:-1] + ', "Programs": ['
+            sep = ''
+        if program is not None:
+            yield sep + json.dumps(program.serialize)
+            sep = ', '
+    if current is not None:
+        yield ']}'
+    yield ']}'
+
+
+def catalog_ndjson(rows):
+    """Yield the full catalog as NDJSON records tagged with their type.
+
+    Each genre record is followed by the records of its programs.
+
+    Args:
+        rows (iterable): (genre, program) pairs as for catalog_json().
+    """
+    current = None
+    for genre, program in rows:
+        if genre.id != current:
+            current = genre.id
+            record = dict(genre.serialize, type='genre')
+            yield json.dumps(record) + '\n'
+        if program is not None:
+            record = dict(program.serialize, type='program')
+            yield json.dumps(record) + '\n'
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+"""manage.py: Command line administration for 'OTR Program Catalog'.
+
+Usage:
+    python manage.py init-db
+    python manage.py recount-programs
+    python manage.py rebuild-stats
+    python manage.py compact-changes
+    python manage.py build-assets
+    python manage.py compile-templates
+    python manage.py write-read-model [--path PATH]
+    python manage.py import-programs FILE --user-email EMAIL [--format FMT]
+
+Run "python manage.py --help" for the full list of commands.
+"""
+
+from application import app, session, read_model, read_model_writer
+from database import db
+from bulk_import import FORMATS, import_programs, read_rows
+from models import User
+from program_counts import recount
+from catalog_stats import rebuild
+from change_feed import compact
+from assets import build
+import template_cache
+
+import argparse
+import json
+import os
+import sys
+
+
+def initDb(args):
+    """Create any missing tables and the full-text search index."""
+    db.create_schema()
+    print 'Database schema is up to date.'
+    return 0
+
+
+def recountPrograms(args):
+    """Recompute every genre's program count, reporting any corrected.
+
+    Returns:
+        int: 0 if all counts were correct, 1 if any were corrected.
+    """
+    drifted = recount(session)
+    session.commit()
+    for genre_id, stored, actual in drifted:
+        print 'Genre %d: program count %d corrected to %d.' % (
+            genre_id, stored, actual)
+    print '%d program count(s) corrected.' % len(drifted)
+    return 1 if drifted else 0
+
+
+def rebuildStats(args):
+    """Recompute the catalog statistics from the program table."""
+    rebuild(session)
+    session.commit()
+    print 'Catalog statistics rebuilt.'
+    return 0
+
+
+def compactChanges(args):
+    """Delete change log entries superseded by later changes."""
+    deleted = compact(session)
+    session.commit()
+    print '%d superseded change(s) deleted.' % deleted
+    return 0
+
+
+def buildAssets(args):
+    """Build fingerprinted, compressed static assets and manifest."""
+    manifest = build(app.static_folder)
+    for path, built in sorted(manifest.items()):
+        print '%s -> %s' % (path, built)
+    print 'Restart the app to serve the new assets.'
+    return 0
+
+
+def compileTemplates(args):
+    """Compile all templates into the app's template cache directory."""
+    directory = args.directory or app.config['TEMPLATE_CACHE_DIR']
+    template_cache.install(app, directory)
+    names = template_cache.precompile(app)
+    print 'Compiled %d templates into %s.' % (len(names), directory)
+    return 0
+
+
+def writeReadModel(args):
+    """Write the read model file, if it is older than the catalog."""
+    path = args.path or app.config['READ_MODEL_PATH']
+    if not path:
+        sys.exit('No read model path; set READ_MODEL_PATH or use --path.')
+    read_model.configure(path)
+    read_model_writer.refresh()
+    read_model.refresh()
+    print 'Read model %s is at catalog version %d.' % (
+        path, read_model.version)
+    return 0
+
+
+def importPrograms(args):
+    """Bulk import programs from a CSV or JSONL file.
+
+    Prints the import report (in JSON form) to stdout.
+
+    Returns:
+        int: 0 if every row was imported, 1 otherwise.
+    """
+    fmt = args.format or os.path.splitext(args.file)[1].lstrip('.').lower()
+    if fmt not in FORMATS:
+        sys.exit('Unknown import format "%s"; use --format.' % fmt)
+    user = session.query(User).filter_by(email=args.user_email).first()
+    if user is None:
+        sys.exit('No user with email "%s".' % args.user_email)
+    with open(args.file, 'rb') as stream:
+        report = import_programs(session, read_rows(stream, fmt), user.id)
+    print json.dumps(report, indent=2)
+    return 1 if report['errors'] else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='OTR Program Catalog '
+                                                 'administration.')
+    commands = parser.add_subparsers(title='commands')
+
+    command = commands.add_parser('init-db',
+                                  help='create database tables and indexes')
+    command.set_defaults(func=initDb)
+
+    command = commands.add_parser('recount-programs',
+                                  help="recompute genres' program counts")
+    command.set_defaults(func=recountPrograms)
+
+    command = commands.add_parser('rebuild-stats',
+                                  help='recompute catalog statistics')
+    command.set_defaults(func=rebuildStats)
+
+    command = commands.add_parser('compact-changes',
+                                  help='delete superseded change feed '
+                                       'entries')
+    command.set_defaults(func=compactChanges)
+
+    command = commands.add_parser('build-assets',
+                                  help='fingerprint and compress static '
+                                       'files')
+    command.set_defaults(func=buildAssets)
+
+    command = commands.add_parser('compile-templates',
+                                  help='precompile templates into the '
+                                       'template cache')
+    command.add_argument('--directory',
+                         help='template cache directory (default: the '
+                              "app's TEMPLATE_CACHE_DIR)")
+    command.set_defaults(func=compileTemplates)
+
+    command = commands.add_parser('write-read-model',
+                                  help='write the shared read model file')
+    command.add_argument('--path',
+                         help="read model file (default: the app's "
+                              'READ_MODEL_PATH)')
+    command.set_defaults(func=writeReadModel)
+
+    command = commands.add_parser('import-programs',
+                                  help='bulk import programs')
+    command.add_argument('file', help='CSV or JSONL file of programs')
+    command.add_argument('--format', choices=FORMATS,
+                         help='file format (default: from file extension)')
+    command.add_argument('--user-email', required=True,
+                         help='email of user to credit with the programs')
+    command.set_defaults(func=importPrograms)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
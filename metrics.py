@@ -0,0 +1,183 @@
+"""metrics.py: Per-request SQL and latency instrumentation.
+
+Counts the SQL statements each request issues and the time spent in the
+database (via SQLAlchemy cursor execute events), records wall-clock
+latency per Flask endpoint, and renders everything in the Prometheus
+text exposition format.
+"""
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+import threading
+import time
+
+
+# Upper bounds (in seconds) of request latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0)
+
+# Upper bounds of the queries-per-request histogram buckets.
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram(object):
+    """Cumulative histogram of observed values."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Record one observation of 'value'."""
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+
+def _labels(**labels):
+    """Return Prometheus label set string for 'labels'."""
+    return '{%s}' % ','.join('%s="%s"' % (k, str(v).replace('"', '\\"'))
+                             for k, v in sorted(labels.items()))
+
+
+class Metrics(object):
+    """Registry of request and database metrics for one application.
+
+    Usage:
+        metrics = Metrics()
+        metrics.install(app, engine)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.latency = {}
+        self.queries = {}
+        self.query_time = {}
+        self.queries_per_request = {}
+        self._collectors = []
+
+    def install(self, app, engine):
+        """Instrument Flask 'app' and SQLAlchemy 'engine'.
+
+        If the app's DB_TIMING_HEADERS config value is True, X-DB-Queries
+        and X-DB-Time (in milliseconds) headers are added to every
+        response.
+
+        Args:
+            app (Flask): Application whose requests are measured.
+            engine (Engine): Engine whose queries are counted (or the
+                Engine class, to count queries on every engine).
+        """
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def register(self, name, kind, help, collect):
+        """Add a metric whose value is read when metrics are rendered.
+
+        Args:
+            name (str): Metric name.
+            kind (str): Prometheus metric type ('counter' or 'gauge').
+            help (str): Description of the metric.
+            collect (callable): Returns the metric's current value, or
+                a dict of values keyed by tuples of (label, value) pairs.
+        """
+        self._collectors.append((name, kind, help, collect))
+
+    def _before_execute(self, conn, cursor, statement, parameters, context,
+                        executemany):
+        conn.info.setdefault('query_start', []).append(time.time())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context,
+                       executemany):
+        elapsed = time.time() - conn.info['query_start'].pop()
+        if has_request_context() and hasattr(g, 'db_queries'):
+            g.db_queries += 1
+            g.db_time += elapsed
+
+    def _before_request(self):
+        g.request_start = time.time()
+        g.db_queries = 0
+        g.db_time = 0.0
+
+    def _after_request(self, response):
+        if not hasattr(g, 'request_start'):
+            return response
+        elapsed = time.time() - g.request_start
+        endpoint = request.endpoint or 'none'
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            if endpoint not in self.latency:
+                self.latency[endpoint] = Histogram(LATENCY_BUCKETS)
+                self.queries_per_request[endpoint] = Histogram(QUERY_BUCKETS)
+            self.latency[endpoint].observe(elapsed)
+            self.queries_per_request[endpoint].observe(g.db_queries)
+            self.queries[endpoint] = (self.queries.get(endpoint, 0) +
+                                      g.db_queries)
+            self.query_time[endpoint] = (self.query_time.get(endpoint, 0.0) +
+                                         g.db_time)
+        if current_app.config.get('DB_TIMING_HEADERS'):
+            response.headers['X-DB-Queries'] = str(g.db_queries)
+            response.headers['X-DB-Time'] = '%.3f' % (g.db_time * 1000)
+        return response
+
+    def render(self):
+        """Return all metrics in Prometheus text exposition format."""
+        lines = []
+
+        def header(name, kind, help):
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s %s' % (name, kind))
+
+        def histogram(name, help, data):
+            header(name, 'histogram', help)
+            for endpoint, hist in sorted(data.items()):
+                for bound, count in zip(hist.buckets, hist.counts):
+                    lines.append('%s_bucket%s %d' % (
+                        name, _labels(endpoint=endpoint, le=bound), count))
+                lines.append('%s_bucket%s %d' % (
+                    name, _labels(endpoint=endpoint, le='+Inf'), hist.count))
+                lines.append('%s_sum%s %f' % (name, _labels(endpoint=endpoint),
+                                              hist.sum))
+                lines.append('%s_count%s %d' % (
+                    name, _labels(endpoint=endpoint), hist.count))
+
+        with self._lock:
+            header('otr_requests_total', 'counter',
+                   'Requests handled, by endpoint.')
+            for endpoint, value in sorted(self.requests.items()):
+                lines.append('otr_requests_total%s %d' % (
+                    _labels(endpoint=endpoint), value))
+            histogram('otr_request_duration_seconds',
+                      'Request latency, by endpoint.', self.latency)
+            header('otr_db_queries_total', 'counter',
+                   'SQL statements executed, by endpoint.')
+            for endpoint, value in sorted(self.queries.items()):
+                lines.append('otr_db_queries_total%s %d' % (
+                    _labels(endpoint=endpoint), value))
+            header('otr_db_query_seconds_total', 'counter',
+                   'Time spent executing SQL statements, by endpoint.')
+            for endpoint, value in sorted(self.query_time.items()):
+                lines.append('otr_db_query_seconds_total%s %f' % (
+                    _labels(endpoint=endpoint), value))
+            histogram('otr_db_queries_per_request',
+                      'SQL statements executed per request, by endpoint.',
+                      self.queries_per_request)
+
+        for name, kind, help, collect in self._collectors:
+            header(name, kind, help)
+            value = collect()
+            if isinstance(value, dict):
+                for labels, v in sorted(value.items()):
+                    lines.append('%s%s %s' % (name, _labels(**dict(labels)),
+                                              v))
+            else:
+                lines.append('%s %s' % (name, value))
+        return '\n'.join(lines) + '\n'
@@ -1,14 +1,17 @@
 """models.py: Creates ORM objects for 'OTR Program Catalog' app."""
 
 from sqlalchemy import (Column, Integer, String, DateTime, ForeignKey,
-                        create_engine, func)
+                        Index, create_engine, event, func)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker, validates
+from sqlalchemy.orm.attributes import get_history
 import random
 import string
 import datetime
 from validation_routines import strIsInt, strLenValid, strIntValid
-from db_creds import db_creds
+from catalog_stats import add_stats, program_stats
+from change_feed import add_change
+from collections import Counter
 
 Base = declarative_base()
 secret_key = ''.join(random.choice(string.ascii_uppercase + string.digits
@@ -59,6 +62,8 @@ class Genre(Base):
         user_id (Integer): Id of user who added the genre
             (Foreign key pointing to "id" field in User table)
         user (Relationship): Link to User class
+        program_count (Integer): Number of programs in the genre
+            (maintained by the Program event listeners below)
         time_created (DateTime): Record creation timestamp
         time_updated (DateTime): Record update timestamp
     """
@@ -67,6 +72,8 @@ class Genre(Base):
     name = Column(String(100), nullable=False, unique=True)
     user_id = Column(Integer, ForeignKey('user.id'))
     user = relationship(User)
+    program_count = Column(Integer, nullable=False, default=0,
+                           server_default='0')
     time_created = Column(DateTime(timezone=True), server_default=func.now())
     time_updated = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -125,6 +132,9 @@ class Program(Base):
     time_created = Column(DateTime(timezone=True), server_default=func.now())
     time_updated = Column(DateTime(timezone=True), onupdate=func.now())
 
+    # Supports paging through a genre's programs in name order.
+    __table_args__ = (Index('ix_program_genre_id_name', 'genre_id', 'name'),)
+
     @validates('name')
     def validate_name(self, key, name):
         """Validator routine for program 'name' field."""
@@ -148,6 +158,9 @@ class Program(Base):
         if not strIsInt(value) or not strIntValid(value, 1920, 1980):
             raise AssertionError('{} must be an integer year between 1920 \
                                  and 1980.'.format(key))
+        # Return an int, as loaded from the database, so that assigning
+        # an unchanged year (e.g., from the edit form) is not a change.
+        value = int(value)
         if key == 'yearEnded' and not self.yearBegan <= value:
             raise AssertionError('yearEnded must be greater than or equal \
                                  to yearBegan.')
@@ -166,13 +179,135 @@ class Program(Base):
         }
 
 
-# Connect to Database and create database session.
-dbURL = "{}://{}:{}@{}:{}/{}".format(
-                                     db_creds['driver'],
-                                     db_creds['user'],
-                                     db_creds['passwd'],
-                                     db_creds['host'],
-                                     db_creds['port'],
-                                     db_creds['database'])
-engine = create_engine(dbURL)
-Base.metadata.create_all(engine)
+class CatalogStat(Base):
+    """
+    Class for CatalogStat table, which stores catalog statistics.
+
+    Each record holds the number of programs counted towards one
+    statistic (see catalog_stats.py). It is maintained by the Program
+    event listeners below.
+
+    Attributes:
+        kind (String): Kind of statistic ('year', 'decade', 'user' or
+            'total')
+        value (Integer): Year, first year of decade or user id (0 for
+            'total')
+        programs (Integer): Number of programs
+    """
+    __tablename__ = 'catalog_stat'
+    kind = Column(String(16), primary_key=True)
+    value = Column(Integer, primary_key=True, autoincrement=False)
+    programs = Column(Integer, nullable=False, default=0)
+
+
+class CatalogChange(Base):
+    """
+    Class for CatalogChange table, which logs catalog changes.
+
+    Each record notes one genre or program being created, updated or
+    deleted (see change_feed.py); records for deleted genres and
+    programs are kept as tombstones. It is maintained by the Genre and
+    Program event listeners below.
+
+    Attributes:
+        id (Integer): Primary key, increasing in commit order
+        kind (String): Kind of record changed ('genre' or 'program')
+        record_id (Integer): Id of genre or program changed
+        op (String): Change made ('create', 'update' or 'delete')
+        time_changed (DateTime): Change timestamp
+    """
+    __tablename__ = 'catalog_change'
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(16), nullable=False)
+    record_id = Column(Integer, nullable=False)
+    op = Column(String(8), nullable=False)
+    time_changed = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Supports compacting each record's changes (see change_feed.compact).
+    __table_args__ = (Index('ix_catalog_change_record', 'kind',
+                            'record_id'),)
+
+
+# Columns of each kind of record which are published (see serialize);
+# changes to other columns are not logged as catalog changes.
+PUBLISHED = {
+    'genre': ('name',),
+    'program': ('name', 'description', 'yearBegan', 'yearEnded',
+                'genre_id'),
+}
+
+
+def _log_changes(model, kind):
+    """Log creates, published updates and deletes of 'model' records."""
+    @event.listens_for(model, 'after_insert')
+    def inserted(mapper, connection, record):
+        add_change(connection, kind, record.id, 'create')
+
+    @event.listens_for(model, 'after_update')
+    def updated(mapper, connection, record):
+        if any(get_history(record, key).has_changes()
+               for key in PUBLISHED[kind]):
+            add_change(connection, kind, record.id, 'update')
+
+    @event.listens_for(model, 'after_delete')
+    def deleted(mapper, connection, record):
+        add_change(connection, kind, record.id, 'delete')
+
+
+_log_changes(Genre, 'genre')
+_log_changes(Program, 'program')
+
+
+# Keep Genre.program_count and catalog statistics current, in the same
+# transaction as the program write which alters them.
+def _count_program(connection, genre_id, delta):
+    """Add 'delta' to the program_count of genre 'genre_id'."""
+    if genre_id is not None:
+        genre = Genre.__table__
+        connection.execute(genre.update().where(
+                               genre.c.id == genre_id).values(
+                               program_count=genre.c.program_count + delta))
+
+
+def _stats(program, current=True):
+    """Return a Counter of the statistics 'program' counts towards.
+
+    If 'current' is False, use the program's values as they were before
+    any changes made since it was loaded.
+    """
+    values = []
+    for key in ('yearBegan', 'yearEnded', 'user_id'):
+        history = get_history(program, key)
+        if not current and history.deleted:
+            values.append(history.deleted[0])
+        else:
+            values.append(getattr(program, key))
+    return Counter(program_stats(*values))
+
+
+@event.listens_for(Program, 'after_insert')
+def program_inserted(mapper, connection, program):
+    _count_program(connection, program.genre_id, 1)
+    add_stats(connection, _stats(program))
+
+
+@event.listens_for(Program, 'after_delete')
+def program_deleted(mapper, connection, program):
+    _count_program(connection, program.genre_id, -1)
+    stats = _stats(program, current=False)
+    add_stats(connection, dict((k, -n) for k, n in stats.items()))
+
+
+@event.listens_for(Program, 'after_update')
+def program_updated(mapper, connection, program):
+    history = get_history(program, 'genre_id')
+    if history.has_changes():
+        for genre_id in history.deleted:
+            _count_program(connection, genre_id, -1)
+        for genre_id in history.added:
+            _count_program(connection, genre_id, 1)
+    if any(get_history(program, key).has_changes()
+           for key in ('yearBegan', 'yearEnded', 'user_id')):
+        stats = _stats(program)
+        stats.subtract(_stats(program, current=False))
+        add_stats(connection, stats)
@@ -0,0 +1,89 @@
+"""pagination.py: Keyset (cursor-based) pagination helpers."""
+
+from sqlalchemy import tuple_
+
+import base64
+import json
+
+
+def encode_cursor(values):
+    """Return an opaque, URL-safe cursor token for a list of key values."""
+    return base64.urlsafe_b64encode(json.dumps(values)).rstrip('=')
+
+
+def decode_cursor(token, types=None):
+    """Return the list of key values encoded in cursor 'token'.
+
+    Args:
+        types (tuple): Type of each value expected, e.g.
+            (basestring, int) (optional).
+
+    Raises:
+        ValueError: If 'token' is not a valid cursor (or does not hold
+            one value of each of 'types').
+    """
+    try:
+        padding = '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(str(token) + padding))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid cursor.')
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor.')
+    if types is not None and (
+            len(values) != len(types) or
+            not all(isinstance(value, kind) and not isinstance(value, bool)
+                    for value, kind in zip(values, types))):
+        raise ValueError('Invalid cursor.')
+    return values
+
+
+def _key_type(key):
+    """Return the type of cursor value expected for column 'key'."""
+    python_type = key.type.python_type
+    return basestring if issubclass(python_type, basestring) else python_type
+
+
+def page_size(requested, default, maximum):
+    """Return 'requested' page size bounded to [1, maximum].
+
+    Args:
+        requested (int): Page size requested by client (or None).
+        default (int): Page size used when none was requested.
+        maximum (int): Largest page size allowed.
+    """
+    if requested is None:
+        return default
+    return max(1, min(requested, maximum))
+
+
+def keyset_page(query, keys, cursor, limit):
+    """Return one page of 'query' ordered by 'keys'.
+
+    Rows are fetched with a key range condition rather than an OFFSET,
+    so each page is a bounded index range scan no matter how deep into
+    the result set it is.
+
+    Args:
+        query (Query): Query to paginate (without ORDER BY or LIMIT).
+        keys (list): Columns forming a unique sort key, e.g.
+            [Program.name, Program.id].
+        cursor (str): Token returned as 'next' by the previous page,
+            or None for the first page.
+        limit (int): Maximum number of rows on the page.
+
+    Returns:
+        tuple: (rows, next) where 'next' is the cursor token for the
+        following page, or None if this is the last page.
+
+    Raises:
+        ValueError: If 'cursor' is not a valid cursor for 'keys'.
+    """
+    if cursor:
+        values = decode_cursor(cursor, [_key_type(k) for k in keys])
+        query = query.filter(tuple_(*keys) > tuple_(*values))
+    rows = query.order_by(*keys).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, k.key) for k in keys])
@@ -0,0 +1,67 @@
+"""program_counts.py: Upkeep of the denormalized Genre.program_count.
+
+The ORM keeps each genre's program_count current as programs are
+added, deleted or moved to another genre (see the event listeners in
+models.py); bulk inserts which bypass the ORM call add_to_counts(). The
+functions here add the column to databases created before it existed
+and recount every genre to repair any drift.
+"""
+
+from sqlalchemy import inspect, select, func, text
+from models import Genre, Program
+
+
+def add_to_counts(conn, counts):
+    """Add numbers of newly inserted programs to their genres' counts.
+
+    Args:
+        conn (Connection or Session): Executes the updates, in its
+            current transaction.
+        counts (dict): Number of programs added, by genre id.
+    """
+    genre = Genre.__table__
+    for genre_id, n in counts.items():
+        if genre_id is not None and n:
+            conn.execute(genre.update().where(
+                             genre.c.id == genre_id).values(
+                             program_count=genre.c.program_count + n))
+
+
+def recount(conn):
+    """Recompute every genre's program_count from the program table.
+
+    Args:
+        conn (Connection or Session): Executes the queries and updates,
+            in its current transaction.
+
+    Returns:
+        list: (genre id, stored count, actual count) for each genre
+        whose stored count was wrong and has been corrected.
+    """
+    genre = Genre.__table__
+    program = Program.__table__
+    actual = select([func.count(program.c.id)]).where(
+                    program.c.genre_id == genre.c.id).as_scalar()
+    drifted = conn.execute(select([genre.c.id, genre.c.program_count,
+                                   actual]).where(
+                                   genre.c.program_count != actual
+                                  ).order_by(genre.c.id)).fetchall()
+    for genre_id, stored, count in drifted:
+        conn.execute(genre.update().where(genre.c.id == genre_id).values(
+                                          program_count=count))
+    return [tuple(row) for row in drifted]
+
+
+def create_program_count(engine):
+    """Add the program_count column to an existing genre table.
+
+    Databases created before the column existed get it (and accurate
+    counts); otherwise, this does nothing.
+    """
+    columns = inspect(engine).get_columns('genre')
+    if 'program_count' in [c['name'] for c in columns]:
+        return
+    with engine.begin() as conn:
+        conn.execute(text('ALTER TABLE genre ADD COLUMN program_count '
+                          'INTEGER NOT NULL DEFAULT 0'))
+        recount(conn)
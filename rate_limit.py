@@ -0,0 +1,102 @@
+"""rate_limit.py: Per-client rate limiting and admission control.
+
+TokenBuckets limits how fast each client may make requests of each
+class: a client's bucket holds up to 'burst' tokens, refilled at 'rate'
+tokens per second, and each request takes one. Admission caps the
+number of requests a process handles at once, so that excess load is
+turned away quickly instead of queueing for database connections.
+
+Both are per process; with several mod_wsgi processes, a client's
+effective limit is multiplied by the number of processes its requests
+are spread over.
+"""
+
+from collections import OrderedDict
+
+import math
+import threading
+import time
+
+
+class TokenBuckets(object):
+    """Token buckets keyed by (client, class).
+
+    At most 'max_keys' buckets are kept; the least recently used are
+    dropped first (a dropped bucket starts again full).
+
+    Attributes:
+        limited (dict): Requests refused, by class.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self.limited = {}
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def take(self, client, cls, rate, burst):
+        """Take a token from the bucket of 'client' for class 'cls'.
+
+        Args:
+            client (str): Client identifier (e.g., IP address).
+            cls (str): Request class.
+            rate (float): Tokens added per second.
+            burst (int): Bucket capacity.
+
+        Returns:
+            float: 0 if the request may proceed; otherwise, the number
+            of seconds until a token will be available.
+        """
+        key = (client, cls)
+        now = time.time()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - last) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                self.limited[cls] = self.limited.get(cls, 0) + 1
+                wait = (1 - tokens) / rate if rate > 0 else 60.0
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+def retry_after(wait):
+    """Return Retry-After header value (whole seconds) for 'wait'."""
+    return str(max(1, int(math.ceil(wait))))
+
+
+class Admission(object):
+    """Cap on the number of requests handled concurrently.
+
+    Attributes:
+        in_flight (int): Requests currently admitted.
+        shed (int): Requests refused because the cap was reached.
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self.shed = 0
+        self._lock = threading.Lock()
+
+    def enter(self, limit):
+        """Admit a request if fewer than 'limit' are in flight.
+
+        Returns:
+            bool: True if admitted; leave() must then be called when
+            the request is done.
+        """
+        with self._lock:
+            if limit is not None and self.in_flight >= limit:
+                self.shed += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        """Release a request admitted by enter()."""
+        with self._lock:
+            self.in_flight -= 1
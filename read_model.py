@@ -0,0 +1,388 @@
+"""read_model.py: Memory-mapped catalog summary shared by app processes.
+
+The read model is a compact binary file holding every genre (id, name,
+user id and number of programs) and a summary of every program (id,
+name, genre id and years on air), with each genre's programs stored
+together in the database's name order. Every app process maps the
+file into memory,
+so all processes share one copy of it (in the OS page cache) and read
+it without querying the database or building their own caches.
+
+A ReadModelWriter rewrites the file in the background after catalog
+writes and when the catalog version shows that another process has
+written to the catalog. Each new file is written under a temporary name
+and renamed into place, then the generation counter in a small
+companion file ("<path>.gen") is incremented. Readers map the counter
+file too, so checking for a new file costs a memory read rather than a
+system call.
+
+Records are kept in the order the database lists them (ORDER BY name,
+id), rather than sorted again here, since the database's collation may
+order names differently from Python; a page of programs is then the same
+whichever of the two it is read from, and so is the page which a cursor
+from either leads to. Cursors are located by program id.
+
+File layout (little-endian):
+    header:  magic, format, generation, catalog version, number of
+             genres, number of programs
+    genres:  one record per genre, in name order
+    programs: one record per program, grouped by genre (in the order of
+             the genre records) and in name order within each genre
+    ids:     (program id, program record index) for each program, in id
+             order
+    strings: UTF-8 names referred to by offset and length
+"""
+
+from collections import namedtuple
+
+from background import BackgroundRefresh
+
+import fcntl
+import mmap
+import os
+import struct
+import tempfile
+
+
+MAGIC = 'OTRM'
+FORMAT = 2
+
+# magic, format, generation, version, genres, programs
+HEADER = struct.Struct('<4sIQQII')
+# id, user id, index of first program, programs, name offset, length
+GENRE = struct.Struct('<IIIIII')
+# id, genre id, yearBegan, yearEnded, name offset, name length
+PROGRAM = struct.Struct('<IIHHII')
+# program id, index of program record
+PROGRAM_ID = struct.Struct('<II')
+GENERATION = struct.Struct('<Q')
+
+GenreSummary = namedtuple('GenreSummary', 'id name user_id program_count')
+ProgramSummary = namedtuple('ProgramSummary',
+                            'id name genre_id yearBegan yearEnded')
+
+# A loaded file: its generation and catalog version, the map, the genres
+# (in name order, and by id, with each genre's first program index), the
+# number of programs and the offsets of the program records, program ids
+# and strings.
+_State = namedtuple('_State', 'generation version map genres by_id first '
+                              'count programs ids strings')
+
+
+def _generation_path(path):
+    return path + '.gen'
+
+
+def read_generation(path):
+    """Return the generation counter of the read model at 'path'.
+
+    Returns:
+        int: Generation of the latest file written (0 if none).
+    """
+    try:
+        with open(_generation_path(path), 'rb') as f:
+            return GENERATION.unpack(f.read(GENERATION.size))[0]
+    except (IOError, struct.error):
+        return 0
+
+
+def read_version(path):
+    """Return the catalog version of the read model at 'path'.
+
+    Returns:
+        int: Catalog version, or None if there is no valid file.
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+        magic, fmt, generation, version, genres, programs = (
+            HEADER.unpack(header))
+    except (IOError, struct.error):
+        return None
+    if magic != MAGIC or fmt != FORMAT:
+        return None
+    return version
+
+
+def write(path, genres, programs, version):
+    """Write a read model of 'genres' and 'programs' to 'path'.
+
+    Args:
+        genres (iterable): (id, name, user_id) tuples, in name order.
+        programs (iterable): (id, name, genre_id, yearBegan, yearEnded)
+            tuples, in (name, id) order. Programs with no genre are left
+            out.
+        version (int): Catalog version the data reflects.
+
+    Returns:
+        int: Generation of the new file.
+    """
+    by_genre = {}
+    for program in programs:
+        by_genre.setdefault(program[2], []).append(program)
+    strings = []
+    size = [0]
+
+    def add(text):
+        """Add 'text' to the strings; return its offset and length."""
+        if isinstance(text, str):
+            text = text.decode('utf-8')
+        data = text.encode('utf-8')
+        strings.append(data)
+        size[0] += len(data)
+        return size[0] - len(data), len(data)
+    genre_records = []
+    program_records = []
+    ids = []
+    for genre_id, name, user_id in genres:
+        listed = by_genre.get(genre_id, ())
+        genre_records.append(GENRE.pack(genre_id, user_id or 0,
+                                        len(program_records), len(listed),
+                                        *add(name)))
+        for program_id, title, in_genre, began, ended in listed:
+            ids.append((program_id, len(program_records)))
+            program_records.append(PROGRAM.pack(program_id, in_genre,
+                                                int(began), int(ended),
+                                                *add(title)))
+    ids.sort()
+    generation = read_generation(path) + 1
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, FORMAT, generation, version,
+                                len(genre_records), len(program_records)))
+            f.writelines(genre_records)
+            f.writelines(program_records)
+            f.writelines(PROGRAM_ID.pack(*i) for i in ids)
+            f.writelines(strings)
+            f.flush()
+            os.fsync(f.fileno())
+        # Readable by app processes running as other users.
+        os.chmod(tmp, 0o644)
+        os.rename(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    # Update the counter in place, so that readers' maps of it see the
+    # new value.
+    counter = _generation_path(path)
+    mode = 'r+b' if os.path.exists(counter) else 'wb'
+    with open(counter, mode) as f:
+        f.write(GENERATION.pack(generation))
+    os.chmod(counter, 0o644)
+    return generation
+
+
+class ReadModel(object):
+    """Reader of the read model file at 'path'.
+
+    refresh() loads a new file when the generation counter changes. The
+    model is 'usable' once loaded, unless a write made by this process
+    is not yet reflected in it (see expect()); callers should then read
+    from the database instead.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._counter = None
+        self._state = None
+        self._min_version = 0
+
+    def configure(self, path):
+        """Read the read model at 'path' (None disables it)."""
+        self.path = path
+        self._counter = None
+        self._state = None
+        self._min_version = 0
+
+    @property
+    def generation(self):
+        """Generation of the loaded file (None if none is loaded)."""
+        state = self._state
+        return state.generation if state else None
+
+    @property
+    def version(self):
+        """Catalog version of the loaded file (None if none is loaded)."""
+        state = self._state
+        return state.version if state else None
+
+    def usable(self):
+        """Return True if the loaded file reflects this process's writes."""
+        state = self._state
+        return state is not None and state.version >= self._min_version
+
+    def expect(self, version):
+        """Stop using files older than catalog 'version' (e.g., after a
+        write by this process, until the file is rewritten).
+        """
+        self._min_version = max(self._min_version, version)
+
+    def _current_generation(self):
+        """Return the value of the generation counter, or None."""
+        if self._counter is None:
+            try:
+                with open(_generation_path(self.path), 'rb') as f:
+                    self._counter = mmap.mmap(f.fileno(), GENERATION.size,
+                                              access=mmap.ACCESS_READ)
+            except (IOError, OSError, ValueError, mmap.error):
+                return None
+        return GENERATION.unpack_from(self._counter)[0]
+
+    def refresh(self):
+        """Load the latest file if the generation counter has changed.
+
+        Returns:
+            bool: True if a new file was loaded.
+        """
+        if self.path is None:
+            return False
+        generation = self._current_generation()
+        state = self._state
+        if generation is None or (state is not None and
+                                  state.generation == generation):
+            return False
+        try:
+            with open(self.path, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, fmt, written, version, genres, programs = (
+                HEADER.unpack_from(data))
+        except (IOError, OSError, ValueError, mmap.error, struct.error):
+            return False
+        if magic != MAGIC or fmt != FORMAT:
+            return False
+        program_base = HEADER.size + genres * GENRE.size
+        id_base = program_base + programs * PROGRAM.size
+        string_base = id_base + programs * PROGRAM_ID.size
+        listed = []
+        first = {}
+        for i in range(genres):
+            genre_id, user_id, start, count, offset, length = (
+                GENRE.unpack_from(data, HEADER.size + i * GENRE.size))
+            name = data[string_base + offset:
+                        string_base + offset + length].decode('utf-8')
+            listed.append(GenreSummary(genre_id, name, user_id or None,
+                                       count))
+            first[genre_id] = start
+        # The map stays open while any reader holds the old state.
+        self._state = _State(generation, version, data, listed,
+                             dict((i.id, i) for i in listed), first,
+                             programs, program_base, id_base, string_base)
+        return True
+
+    # The following methods read the loaded file; call them only if
+    # usable() is True.
+    def genres(self):
+        """Return the genres (GenreSummary tuples), in name order."""
+        return list(self._state.genres)
+
+    def genre(self, genre_id):
+        """Return the GenreSummary of genre 'genre_id', or None."""
+        return self._state.by_id.get(genre_id)
+
+    def _program(self, state, index):
+        """Return program record 'index' as a ProgramSummary."""
+        program_id, genre_id, began, ended, offset, length = (
+            PROGRAM.unpack_from(state.map,
+                                state.programs + index * PROGRAM.size))
+        start = state.strings + offset
+        name = state.map[start:start + length].decode('utf-8')
+        return ProgramSummary(program_id, name, genre_id, began, ended)
+
+    def _index(self, state, program_id):
+        """Return the index of program 'program_id's record, or None."""
+        low, high = 0, state.count
+        while low < high:
+            middle = (low + high) // 2
+            found, index = PROGRAM_ID.unpack_from(
+                state.map, state.ids + middle * PROGRAM_ID.size)
+            if found == program_id:
+                return index
+            if found < program_id:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def programs(self, genre_id, after=None, limit=None):
+        """Return one page of the programs in genre 'genre_id'.
+
+        Args:
+            after (tuple): (name, id) of the last program of the
+                previous page, or None for the first page.
+            limit (int): Maximum number of programs on the page (None
+                for all).
+
+        Returns:
+            tuple: (programs, more) where 'programs' is a list of
+            ProgramSummary tuples in name order and 'more' is True if
+            further programs follow the page; or None if program 'after'
+            is not in the genre under that name (e.g., it has since been
+            deleted or renamed), in which case the page must be read
+            from the database.
+        """
+        state = self._state
+        genre = state.by_id.get(genre_id)
+        if genre is None:
+            return [], False
+        start = state.first[genre_id]
+        end = start + genre.program_count
+        if after is not None:
+            name, program_id = after
+            index = self._index(state, program_id)
+            if (index is None or not start <= index < end or
+                    self._program(state, index).name != name):
+                return None
+            start = index + 1
+        stop = end if limit is None else min(end, start + limit)
+        return ([self._program(state, i) for i in range(start, stop)],
+                stop < end)
+
+
+class ReadModelWriter(BackgroundRefresh):
+    """Rewrites a read model file in the background after writes.
+
+    Processes take turns (through a lock file, "<path>.lock"), and a
+    process finding the file already up to date leaves it alone.
+    """
+
+    name = 'read-model'
+
+    def __init__(self, read_model, load, version, delay=1.0, interval=5.0):
+        """Args:
+            read_model (ReadModel): Reader whose file is written.
+            load (callable): Returns (genres, programs) as for write().
+            version (callable): Returns the catalog version.
+            delay (float): Seconds from a write to the rewrite.
+            interval (float): Seconds between version checks.
+        """
+        BackgroundRefresh.__init__(self, delay, interval)
+        self.read_model = read_model
+        self.load = load
+        self.version = version
+
+    def changed(self):
+        if self.read_model.path is not None:
+            BackgroundRefresh.changed(self)
+
+    def refresh(self, force=False):
+        """Rewrite the file if it is older than the catalog.
+
+        Every change to the data in the file is logged as a catalog
+        change, so the file is current if its version is; 'force' is
+        ignored.
+        """
+        path = self.read_model.path
+        if path is None:
+            return
+        with open(path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            version = self.version()
+            written = read_version(path)
+            if written is not None and written >= version:
+                return
+            genres, programs = self.load()
+            write(path, genres, programs, version)
+            self.builds += 1
@@ -0,0 +1,124 @@
+"""revocation.py: Background revocation of OAuth tokens.
+
+Logging out queues the user's access token here instead of waiting on
+Google's revocation endpoint, so a slow endpoint never stalls a logout.
+A small pool of worker threads sends the revocations, retrying failures
+with exponential backoff. Tokens still queued when the process exits
+are not revoked (they expire on their own).
+"""
+
+import Queue
+import logging
+import threading
+import time
+
+
+log = logging.getLogger(__name__)
+
+
+class RevocationQueue(object):
+    """Bounded queue of tokens revoked by background worker threads.
+
+    Attributes:
+        pending (int): Tokens queued or being revoked.
+        succeeded (int): Tokens revoked.
+        failed (int): Tokens given up on after all attempts, or dropped
+            because the queue was full.
+        retries (int): Revocation attempts which were retried.
+    """
+
+    def __init__(self, revoke, workers=2, max_pending=1000, attempts=5,
+                 backoff=1.0, max_backoff=60.0):
+        """Args:
+            revoke (callable): Revokes a token; returns True on success.
+                May raise an exception, which counts as a failure.
+            workers (int): Maximum number of concurrent revocations.
+            max_pending (int): Maximum number of queued tokens.
+            attempts (int): Attempts per token before giving up.
+            backoff (float): Seconds to wait before the first retry;
+                doubled for each subsequent retry.
+            max_backoff (float): Longest wait between retries.
+        """
+        self.revoke = revoke
+        self.workers = workers
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pending = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retries = 0
+        self._queue = Queue.Queue(max_pending)
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _start(self):
+        """Start worker threads if not yet running in this process.
+
+        Threads are started on first use rather than at import so that
+        each forked worker process gets its own.
+        """
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work,
+                                          name='token-revocation')
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, token):
+        """Queue 'token' for revocation; return False if queue is full."""
+        self._start()
+        with self._lock:
+            self.pending += 1
+        try:
+            self._queue.put_nowait(token)
+        except Queue.Full:
+            log.warning('Revocation queue full; token dropped.')
+            self._finish(False)
+            return False
+        return True
+
+    def _finish(self, revoked):
+        with self._lock:
+            self.pending -= 1
+            if revoked:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+
+    def _attempt(self, token):
+        """Try to revoke 'token' once; return True on success."""
+        try:
+            return bool(self.revoke(token))
+        except Exception:
+            log.exception('Token revocation failed.')
+            return False
+
+    def _work(self):
+        while True:
+            token = self._queue.get()
+            delay = self.backoff
+            for attempt in range(self.attempts):
+                if attempt:
+                    with self._lock:
+                        self.retries += 1
+                    time.sleep(delay)
+                    delay = min(delay * 2, self.max_backoff)
+                if self._attempt(token):
+                    self._finish(True)
+                    break
+            else:
+                self._finish(False)
+            self._queue.task_done()
+
+    def join(self):
+        """Block until every queued token has been processed."""
+        self._queue.join()
+
+    def stats(self):
+        """Return revocation counters in dictionary form."""
+        with self._lock:
+            return {'pending': self.pending, 'succeeded': self.succeeded,
+                    'failed': self.failed, 'retries': self.retries}
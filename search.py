@@ -0,0 +1,131 @@
+"""search.py: Full-text search over program names and descriptions.
+
+PostgreSQL databases are searched through a GIN index on a tsvector
+expression; SQLite databases through an FTS5 table kept in step with the
+program table by triggers. In both cases the index is maintained by the
+database itself, so every insert, update and delete of a program
+(including addProgram, editProgram and deleteProgram) is reflected in
+search results as soon as it is committed.
+"""
+
+from sqlalchemy import text
+
+import re
+
+
+# Text search document for a program. Queries must use the exact
+# expression the GIN index was built on for PostgreSQL to use the index.
+PG_DOCUMENT = ("to_tsvector('english', name || ' ' || "
+               "coalesce(description, ''))")
+
+PG_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_program_search ON program "
+    "USING gin ((%s))" % PG_DOCUMENT,
+]
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS program_fts USING fts5("
+    "name, description, content='program', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS program_fts_insert AFTER INSERT ON program "
+    "BEGIN "
+    "INSERT INTO program_fts (rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS program_fts_delete AFTER DELETE ON program "
+    "BEGIN "
+    "INSERT INTO program_fts (program_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS program_fts_update AFTER UPDATE ON program "
+    "BEGIN "
+    "INSERT INTO program_fts (program_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO program_fts (rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); "
+    "END",
+]
+
+PG_QUERY = """
+SELECT id, name, description, "yearBegan", "yearEnded", genre_id,
+       ts_rank({doc}, query) AS rank
+FROM program, plainto_tsquery('english', :q) AS query
+WHERE {doc} @@ query
+ORDER BY rank DESC, id
+LIMIT :limit OFFSET :offset
+""".format(doc=PG_DOCUMENT)
+
+SQLITE_QUERY = """
+SELECT p.id, p.name, p.description, p."yearBegan", p."yearEnded",
+       p.genre_id, -bm25(program_fts) AS rank
+FROM program_fts JOIN program AS p ON p.id = program_fts.rowid
+WHERE program_fts MATCH :q
+ORDER BY bm25(program_fts), p.id
+LIMIT :limit OFFSET :offset
+"""
+
+
+def create_search_index(engine):
+    """Create the full-text index for 'engine' if it does not exist.
+
+    The SQLite index is (re)built from the program table when it is
+    first created.
+
+    Raises:
+        NotImplementedError: If the database is neither PostgreSQL nor
+            SQLite.
+    """
+    name = engine.dialect.name
+    with engine.begin() as conn:
+        if name == 'postgresql':
+            for ddl in PG_DDL:
+                conn.execute(text(ddl))
+        elif name == 'sqlite':
+            exists = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE name = 'program_fts'"
+            )).first()
+            for ddl in SQLITE_DDL:
+                conn.execute(text(ddl))
+            if not exists:
+                conn.execute(text(
+                    "INSERT INTO program_fts (program_fts) VALUES ('rebuild')"
+                ))
+        else:
+            raise NotImplementedError(
+                'Full-text search is not supported for %s.' % name)
+
+
+def fts5_query(q):
+    """Return an FTS5 MATCH expression requiring every word in 'q'.
+
+    Words are quoted so that FTS5 operators in user input are treated
+    as plain text.
+    """
+    words = re.findall(r'\w+', q, re.UNICODE)
+    return ' '.join('"%s"' % w for w in words)
+
+
+def search_programs(session, q, limit, offset=0):
+    """Return programs matching search text 'q', best matches first.
+
+    Args:
+        session (Session): Database session.
+        q (str): Search text entered by user.
+        limit (int): Maximum number of results.
+        offset (int): Number of results to skip.
+
+    Returns:
+        list: Rows with id, name, description, yearBegan, yearEnded,
+        genre_id and rank columns.
+    """
+    name = session.get_bind().dialect.name
+    if name == 'postgresql':
+        sql = PG_QUERY
+    elif name == 'sqlite':
+        sql, q = SQLITE_QUERY, fts5_query(q)
+        if not q:
+            return []
+    else:
+        raise NotImplementedError(
+            'Full-text search is not supported for %s.' % name)
+    return session.execute(text(sql), {'q': q, 'limit': limit,
+                                       'offset': offset}).fetchall()
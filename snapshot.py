@@ -0,0 +1,76 @@
+"""snapshot.py: Prebuilt, precompressed snapshot of the full catalog.
+
+The full catalog document is built once, compressed once per content
+encoding and kept in memory, so that serving it costs no queries and no
+encoding. It is rebuilt in the background (see background.py) after
+catalog writes, and when the catalog version shows that another
+process has written to the catalog.
+"""
+
+from collections import namedtuple
+
+from background import BackgroundRefresh
+
+import hashlib
+import time
+
+
+Snapshot = namedtuple('Snapshot', 'body etag encoded version built_at')
+
+
+class CatalogSnapshot(BackgroundRefresh):
+    """Catalog document rebuilt in the background after writes.
+
+    Usage:
+        snapshot = CatalogSnapshot(build, version, encode)
+        current = snapshot.get()  # None until first built
+        snapshot.changed()        # after each committed catalog write
+    """
+
+    name = 'catalog-snapshot'
+
+    def __init__(self, build, version, encode=None, delay=1.0,
+                 interval=5.0):
+        """Args:
+            build (callable): Returns the catalog document (str).
+            version (callable): Returns a value which changes whenever
+                the catalog does (e.g., the latest change id); called
+                every 'interval' seconds, so it should be cheap.
+            encode (callable): Returns a dict of compressed copies of a
+                document, keyed by content encoding (optional).
+            delay (float): Seconds from a write to the rebuild.
+            interval (float): Seconds between version checks.
+        """
+        BackgroundRefresh.__init__(self, delay, interval)
+        self.build = build
+        self.version = version
+        self.encode = encode
+        self._snapshot = None
+
+    def get(self):
+        """Return the current Snapshot, or None if none is built yet.
+
+        The first call starts building one.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            self._schedule(0)
+        return snapshot
+
+    def refresh(self, force=False):
+        """Rebuild the snapshot, unless the catalog version is unchanged.
+
+        Args:
+            force (bool): Rebuild even if the version is unchanged
+                (e.g., after a write which the version does not
+                reflect).
+        """
+        version = self.version()
+        current = self._snapshot
+        if not force and current is not None and current.version == version:
+            return
+        body = self.build()
+        encoded = self.encode(body) if self.encode else {}
+        etag = hashlib.sha1(body).hexdigest()
+        self._snapshot = Snapshot(body, etag, encoded, version, time.time())
+        self.builds += 1
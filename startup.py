@@ -0,0 +1,11 @@
+"""startup.py: Start time of the 'OTR Program Catalog' app import.
+
+application.py imports this module before anything else, so that
+IMPORT_STARTED is the time at which the app import began (see
+application.create_app).
+"""
+
+from timeit import default_timer as timer
+
+
+IMPORT_STARTED = timer()
@@ -0,0 +1,257 @@
+"""suggest.py: Program name suggestions for search box typeahead.
+
+SuggestIndex keeps every program name in memory in two sorted lists:
+one keyed by the whole (lower-cased) name, and one keyed by the rest of
+the name from the start of each later word. The programs whose name, or
+one of whose words, starts with the typed text are then a contiguous
+range of each list, found by binary search. The index is built in the
+background on first use and kept current by applying the catalog change
+feed (see change_feed.py) after each write, and every few seconds to
+pick up writes made by other processes. Changes are merged into new
+copies of the lists, which then replace the old ones, so lookups never
+wait for them to be applied.
+
+Until the index is built, suggest_programs() queries the database; on
+PostgreSQL, a trigram index on the lower-cased name serves the query.
+"""
+
+from bisect import bisect_left
+from collections import namedtuple
+from heapq import merge
+
+from sqlalchemy import func, or_, text
+
+from background import BackgroundRefresh
+from change_feed import changes_after, latest_change
+from models import Program
+
+import re
+import threading
+
+
+PG_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_program_name_trgm ON program "
+    "USING gin (lower(name) gin_trgm_ops)",
+]
+
+# Most changes applied at once while catching up; with more waiting,
+# the index is rebuilt instead.
+CATCH_UP_MAX = 1000
+
+Suggestion = namedtuple('Suggestion', 'id name genre_id')
+
+WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def create_suggest_index(engine):
+    """Create the trigram index used without the in-memory index.
+
+    Only PostgreSQL databases have one; the pg_trgm extension is
+    installed if necessary, which requires the privilege to do so.
+    """
+    if engine.dialect.name != 'postgresql':
+        return
+    with engine.begin() as conn:
+        for ddl in PG_DDL:
+            conn.execute(text(ddl))
+
+
+def normalize(q):
+    """Return typed text 'q' in the form used as an index key."""
+    return u' '.join(q.lower().split())
+
+
+def _keys(name):
+    """Return (name key, word keys) under which 'name' is indexed."""
+    key = normalize(name)
+    words = [key[match.start():] for match in WORD.finditer(key)
+             if match.start() > 0]
+    return key, words
+
+
+def suggest_programs(session, q, limit):
+    """Return programs whose name or a word of it starts with 'q'.
+
+    Queries the database; programs whose name starts with 'q' come
+    first, then those with a later word which does, each in name order.
+
+    Returns:
+        list: Suggestion tuples.
+    """
+    prefix = normalize(q)
+    prefix = (prefix.replace('\\', '\\\\').replace('%', '\\%')
+              .replace('_', '\\_'))
+    name = func.lower(Program.name)
+    starts = name.like(prefix + '%', escape='\\')
+    rows = session.query(Program.id, Program.name, Program.genre_id).filter(
+        or_(starts, name.like('% ' + prefix + '%', escape='\\'))).order_by(
+        starts.desc(), Program.name).limit(limit)
+    return [Suggestion(*row) for row in rows]
+
+
+class SuggestIndex(BackgroundRefresh):
+    """In-memory index of program names, by name and word prefix.
+
+    Usage:
+        index = SuggestIndex(db.session)
+        index.suggest(q, 10)  # None until the index is built
+        index.changed()       # after each committed catalog write
+
+    Attributes:
+        version (int): Id of the latest catalog change applied.
+    """
+
+    name = 'program-suggest'
+
+    def __init__(self, session, delay=0, interval=5.0):
+        """Args:
+            session (scoped_session): Session registry used to read the
+                programs and the change feed (from the background
+                thread, whose session is removed after each refresh).
+            delay (float): Seconds from a write to catching up.
+            interval (float): Seconds between checks for changes.
+        """
+        BackgroundRefresh.__init__(self, delay, interval)
+        self.session = session
+        self.version = 0
+        self._lock = threading.Lock()
+        self._programs = None
+        self._names = []
+        self._words = []
+
+    def suggest(self, q, limit):
+        """Return up to 'limit' programs matching 'q', best first.
+
+        Programs whose name starts with 'q' come first, then those with
+        a later word which does, each in name order.
+
+        Returns:
+            list: Suggestion tuples, or None if the index is not built
+            yet (the first call starts building it).
+        """
+        if self._programs is None:
+            self._schedule(0)
+            return None
+        prefix = normalize(q)
+        found = []
+        seen = set()
+        with self._lock:
+            programs, names, words = self._programs, self._names, self._words
+        for entries in (names, words):
+            i = bisect_left(entries, (prefix,))
+            while i < len(entries) and len(found) < limit:
+                key, program_id = entries[i]
+                if not key.startswith(prefix):
+                    break
+                if program_id not in seen:
+                    seen.add(program_id)
+                    found.append(programs[program_id])
+                i += 1
+        return found
+
+    def changed(self):
+        if self._programs is not None:
+            BackgroundRefresh.changed(self)
+
+    def build(self, session):
+        """Index every program, replacing the current index."""
+        version = latest_change(session)
+        programs = {}
+        names = []
+        words = []
+        for row in session.query(Program.id, Program.name,
+                                 Program.genre_id):
+            program = Suggestion(*row)
+            key, keys = _keys(program.name)
+            programs[program.id] = program
+            names.append((key, program.id))
+            words.extend((word, program.id) for word in keys)
+        names.sort()
+        words.sort()
+        with self._lock:
+            self._programs = programs
+            self._names = names
+            self._words = words
+            self.version = version
+        self.builds += 1
+
+    def catch_up(self, session):
+        """Apply the program changes logged since the index's version.
+
+        If more than CATCH_UP_MAX changes are waiting (e.g., after a
+        bulk import), the index is rebuilt instead.
+        """
+        changes, more = changes_after(session, self.version, CATCH_UP_MAX)
+        if not changes:
+            return
+        if more:
+            self.build(session)
+            return
+        deleted = set()
+        changed = set()
+        for change in changes:
+            if change.kind != 'program':
+                continue
+            if change.op == 'delete':
+                deleted.add(change.record_id)
+                changed.discard(change.record_id)
+            else:
+                changed.add(change.record_id)
+                deleted.discard(change.record_id)
+        current = []
+        if changed:
+            current = session.query(Program.id, Program.name,
+                                    Program.genre_id).filter(
+                                        Program.id.in_(changed)).all()
+        self._apply(deleted | changed, current, changes[-1].id)
+
+    def _apply(self, removed, current, version):
+        """Replace the index with a copy updated by a batch of changes.
+
+        Only the background thread changes the index, and it never
+        changes the lists in place, so they are read without the lock.
+
+        Args:
+            removed (set): Ids of the programs deleted or changed.
+            current (list): (id, name, genre_id) rows of the programs
+                changed.
+            version (int): Id of the latest change in the batch.
+        """
+        programs = dict(self._programs)
+        for program_id in removed:
+            programs.pop(program_id, None)
+        names = []
+        words = []
+        for row in current:
+            program = Suggestion(*row)
+            key, keys = _keys(program.name)
+            programs[program.id] = program
+            names.append((key, program.id))
+            words.extend((word, program.id) for word in keys)
+        names.sort()
+        words.sort()
+        names = list(merge([i for i in self._names if i[1] not in removed],
+                           names))
+        words = list(merge([i for i in self._words if i[1] not in removed],
+                           words))
+        with self._lock:
+            self._programs = programs
+            self._names = names
+            self._words = words
+            self.version = version
+
+    def refresh(self, force=False):
+        """Build the index, or apply changes made since it was built.
+
+        The index is rebuilt if the change log's latest id is lower than
+        the index's version (e.g., after a database restore).
+        """
+        try:
+            if (self._programs is None or
+                    latest_change(self.session) < self.version):
+                self.build(self.session)
+            else:
+                self.catch_up(self.session)
+        finally:
+            self.session.remove()
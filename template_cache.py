@@ -0,0 +1,76 @@
+"""template_cache.py: Filesystem cache of compiled Jinja templates.
+
+Jinja compiles each template to Python bytecode the first time a
+process renders it. With a bytecode cache, a process loads the compiled
+code from disk instead, so the first requests after a restart do not
+pay for compilation. "python manage.py compile-templates" fills the
+cache at deploy time; templates changed since are recompiled (and the
+cache updated) on first use.
+"""
+
+from jinja2 import FileSystemBytecodeCache
+
+import logging
+import os
+import tempfile
+
+
+log = logging.getLogger(__name__)
+
+
+class BytecodeCache(FileSystemBytecodeCache):
+    """FileSystemBytecodeCache with atomic, failure-tolerant writes.
+
+    Each file is written under a temporary name and renamed into place,
+    so that other processes never load a partly written file. If the
+    directory is not writable, the template is still rendered; it is
+    just not cached.
+    """
+
+    def dump_bytecode(self, bucket):
+        filename = self._get_cache_filename(bucket)
+        tmp = None
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(fd, 'wb') as f:
+                bucket.write_bytecode(f)
+            # Readable by app processes running as other users.
+            os.chmod(tmp, 0o644)
+            os.rename(tmp, filename)
+        except (IOError, OSError):
+            log.warning('Could not write template cache file %s.',
+                        filename, exc_info=True)
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+
+
+def install(app, directory):
+    """Cache 'app's compiled templates in 'directory'.
+
+    The directory is created if necessary. If it cannot be, templates
+    are compiled in memory as usual.
+    """
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+    except OSError:
+        log.warning('Could not create template cache directory %s.',
+                    directory, exc_info=True)
+        return
+    app.jinja_env.bytecode_cache = BytecodeCache(directory)
+
+
+def precompile(app):
+    """Compile all of 'app's templates into its bytecode cache.
+
+    Returns:
+        list: Names of the templates compiled.
+    """
+    names = app.jinja_env.list_templates()
+    # Drop templates already loaded in memory, so that each is loaded
+    # (and stored in the bytecode cache) again.
+    if app.jinja_env.cache is not None:
+        app.jinja_env.cache.clear()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return names
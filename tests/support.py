@@ -0,0 +1,101 @@
+"""support.py: Shared fixture for the app's tests.
+
+Each test gets a fresh SQLite database in a temporary directory, with
+a user, two genres and a few programs. The app's background refreshers
+are stopped, so tests which need them call their refresh() directly.
+"""
+
+from application import (create_app, catalog_snapshot, genre_cache,
+                         page_cache, read_model, read_model_writer,
+                         suggest_index)
+from database import db
+from models import User, Genre, Program
+
+import shutil
+import tempfile
+import unittest
+
+
+app = create_app({'SECRET_KEY': 'test', 'TESTING': True,
+                  'RATE_LIMITS': {}, 'TEMPLATE_CACHE_DIR': None})
+for refresher in (catalog_snapshot, suggest_index, read_model_writer):
+    refresher.stop()
+
+
+class CatalogTestCase(unittest.TestCase):
+    """Test case with a newly created, seeded catalog database.
+
+    Attributes:
+        client (FlaskClient): Test client for the app.
+        tmp (str): Temporary directory, removed after the test.
+        user_id (int): Id of the seeded user.
+        genre_id (int): Id of the seeded 'Comedy' genre, which holds
+            the programs in PROGRAMS.
+        other_genre_id (int): Id of the seeded, empty 'Drama' genre.
+    """
+
+    # (name, yearBegan, yearEnded) of the seeded programs.
+    PROGRAMS = [('Fibber McGee and Molly', '1935', '1959'),
+                ('The Jack Benny Program', '1932', '1955'),
+                ('Our Miss Brooks', '1948', '1957'),
+                ('Vic and Sade', '1932', '1946'),
+                ('Duffy\'s Tavern', '1941', '1951')]
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        db.configure(url='sqlite:///{}/catalog.db'.format(self.tmp))
+        db.create_schema()
+        genre_cache.invalidate()
+        page_cache.invalidate()
+        read_model.configure(None)
+        session = db.session
+        user = User(username='tester', email='tester@example.com')
+        session.add(user)
+        session.flush()
+        comedy = Genre(name='Comedy', user_id=user.id)
+        drama = Genre(name='Drama', user_id=user.id)
+        session.add_all([comedy, drama])
+        session.flush()
+        for name, began, ended in self.PROGRAMS:
+            session.add(Program(name=name, yearBegan=began, yearEnded=ended,
+                                description='', genre_id=comedy.id,
+                                user_id=user.id))
+        session.commit()
+        self.user_id = user.id
+        self.genre_id = comedy.id
+        self.other_genre_id = drama.id
+        db.session.remove()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.configure()
+        read_model.configure(None)
+        shutil.rmtree(self.tmp)
+
+    def login(self):
+        """Log the test client in as the seeded user."""
+        with self.client.session_transaction() as s:
+            s['user_name'] = 'tester'
+            s['user_id'] = self.user_id
+            s['email'] = 'tester@example.com'
+            s['provider'] = 'google'
+
+    def add_program(self, name, began='1940', ended='1945', genre_id=None):
+        """Add a program through the app's form, as the seeded user."""
+        self.login()
+        response = self.client.post(
+            '/genre/{}/program/add'.format(genre_id or self.genre_id),
+            data={'name': name, 'yearBegan': began, 'yearEnded': ended,
+                  'description': ''})
+        self.assertEqual(response.status_code, 302)
+        return response
+
+    def program_names(self, genre_id=None):
+        """Return the names of a genre's programs, in name order."""
+        try:
+            return [name for name, in db.session.query(Program.name).filter_by(
+                        genre_id=genre_id or self.genre_id).order_by(
+                        Program.name, Program.id)]
+        finally:
+            db.session.remove()
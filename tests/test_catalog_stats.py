@@ -0,0 +1,109 @@
+"""Tests for the incrementally maintained catalog statistics."""
+
+from tests.support import CatalogTestCase
+from catalog_stats import catalog_stats, program_stats, rebuild
+from database import db
+from models import CatalogStat, Program
+
+from collections import Counter
+
+import json
+import unittest
+
+
+class ProgramStatsTest(unittest.TestCase):
+
+    def test_years_and_decades(self):
+        self.assertEqual(program_stats('1938', '1941', 7), [
+            ('year', 1938), ('year', 1939), ('year', 1940), ('year', 1941),
+            ('decade', 1930), ('decade', 1940), ('user', 7), ('total', 0)])
+
+    def test_no_user(self):
+        self.assertEqual(program_stats(1940, 1940, None),
+                         [('year', 1940), ('decade', 1940), ('total', 0)])
+
+
+class CatalogStatsTest(CatalogTestCase):
+
+    def stored(self):
+        """Return the non-zero statistics stored, keyed by (kind, value)."""
+        try:
+            return dict(((i.kind, i.value), i.programs)
+                        for i in db.session.query(CatalogStat)
+                        if i.programs)
+        finally:
+            db.session.remove()
+
+    def expected(self):
+        """Return the statistics computed from the program table."""
+        try:
+            counts = Counter()
+            for program in db.session.query(Program):
+                counts.update(program_stats(program.yearBegan,
+                                            program.yearEnded,
+                                            program.user_id))
+            return dict(counts)
+        finally:
+            db.session.remove()
+
+    def edit(self, program_id, began, ended):
+        """Edit the years of program 'program_id' through the app."""
+        self.login()
+        program = db.session.query(Program).get(program_id)
+        data = {'name': program.name, 'yearBegan': began,
+                'yearEnded': ended, 'description': ''}
+        db.session.remove()
+        self.client.post('/genre/{}/program/{}/edit'.format(self.genre_id,
+                                                            program_id),
+                         data=data)
+
+    def test_seeded(self):
+        self.assertEqual(self.stored(), self.expected())
+        self.assertEqual(self.stored()[('total', 0)], len(self.PROGRAMS))
+
+    def test_add_and_delete(self):
+        self.add_program('Amos \'n\' Andy', '1928', '1960')
+        self.assertEqual(self.stored(), self.expected())
+        self.client.post('/genre/{}/program/2/delete'.format(self.genre_id))
+        self.assertEqual(self.stored(), self.expected())
+        self.assertEqual(self.stored()[('decade', 1920)], 1)
+
+    def test_edit_years(self):
+        before = self.stored()
+        self.edit(3, '1940', '1949')
+        stored = self.stored()
+        self.assertEqual(stored, self.expected())
+        self.assertEqual(stored[('year', 1957)], before[('year', 1957)] - 1)
+        self.assertEqual(stored[('year', 1940)], before[('year', 1940)] + 1)
+
+    def test_unchanged_edit(self):
+        before = self.stored()
+        self.edit(3, '1948', '1957')
+        self.assertEqual(self.stored(), before)
+
+    def test_rebuild(self):
+        db.session.execute('UPDATE catalog_stat SET programs = 99')
+        rebuild(db.session)
+        db.session.commit()
+        db.session.remove()
+        self.assertEqual(self.stored(), self.expected())
+
+    def test_catalog_stats(self):
+        stats = catalog_stats(db.session)
+        self.assertEqual(stats['programs'], len(self.PROGRAMS))
+        self.assertEqual(dict(stats['years'])[1950], 4)
+        self.assertEqual(dict(stats['decades'])[1920], 0)
+        self.assertEqual(stats['users'], [(self.user_id, 5)])
+
+    def test_stats_json(self):
+        data = json.loads(self.client.get('/stats/JSON').data)
+        self.assertEqual(data['programs'], len(self.PROGRAMS))
+        self.assertEqual(data['users'], [{'id': self.user_id,
+                                          'username': 'tester',
+                                          'programs': 5}])
+        self.assertEqual([(i['name'], i['programs']) for i in data['genres']],
+                         [('Comedy', 5), ('Drama', 0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+"""Tests for the catalog change log (change_feed.py) and /changes."""
+
+from tests.support import CatalogTestCase
+from change_feed import backfill, changes_after, compact, latest_change
+from database import db
+from pagination import encode_cursor
+
+import io
+import json
+import unittest
+
+
+class ChangeLogTest(CatalogTestCase):
+
+    def changes(self, after=0):
+        """Return (kind, record_id, op) of the changes after 'after'."""
+        try:
+            rows, more = changes_after(db.session, after, 1000)
+            return [(i.kind, i.record_id, i.op) for i in rows]
+        finally:
+            db.session.remove()
+
+    def latest(self):
+        try:
+            return latest_change(db.session)
+        finally:
+            db.session.remove()
+
+    def edit(self, program_id, **fields):
+        """Edit program 'program_id' through the app's form."""
+        data = {'name': self.PROGRAMS[program_id - 1][0],
+                'yearBegan': self.PROGRAMS[program_id - 1][1],
+                'yearEnded': self.PROGRAMS[program_id - 1][2],
+                'description': ''}
+        data.update(fields)
+        self.login()
+        self.client.post('/genre/{}/program/{}/edit'.format(self.genre_id,
+                                                            program_id),
+                         data=data)
+
+    def test_seeded(self):
+        self.assertEqual(self.changes(),
+                         [('genre', self.genre_id, 'create'),
+                          ('genre', self.other_genre_id, 'create')] +
+                         [('program', i, 'create')
+                          for i in range(1, len(self.PROGRAMS) + 1)])
+
+    def test_create_update_delete(self):
+        after = self.latest()
+        self.add_program('Amos \'n\' Andy')
+        self.edit(2, name='The Jack Benny Show')
+        self.login()
+        self.client.post('/genre/{}/program/3/delete'.format(self.genre_id))
+        self.assertEqual(self.changes(after), [('program', 6, 'create'),
+                                               ('program', 2, 'update'),
+                                               ('program', 3, 'delete')])
+
+    def test_unchanged_edit_not_logged(self):
+        after = self.latest()
+        self.edit(2)
+        self.assertEqual(self.changes(after), [])
+
+    def test_genre_update(self):
+        after = self.latest()
+        self.login()
+        self.client.post('/genre/{}/edit'.format(self.other_genre_id),
+                         data={'name': 'Adventure'})
+        self.assertEqual(self.changes(after),
+                         [('genre', self.other_genre_id, 'update')])
+
+    def test_bulk_import(self):
+        after = self.latest()
+        self.login()
+        data = ('name,genre,yearBegan,yearEnded\n'
+                'Gunsmoke,Drama,1952,1961\n'
+                'Suspense,Drama,1942,1962\n')
+        self.client.post('/programs/import',
+                         data={'file': (io.BytesIO(data), 'programs.csv')})
+        self.assertEqual(self.changes(after), [('program', 6, 'create'),
+                                               ('program', 7, 'create')])
+
+    def test_compact(self):
+        self.edit(2, name='The Jack Benny Show')
+        self.edit(2, name='Jack Benny')
+        self.login()
+        self.client.post('/genre/{}/program/3/delete'.format(self.genre_id))
+        latest = self.latest()
+        self.assertEqual(compact(db.session), 3)
+        db.session.commit()
+        db.session.remove()
+        changes = self.changes()
+        self.assertIn(('program', 2, 'update'), changes)
+        self.assertIn(('program', 3, 'delete'), changes)
+        self.assertNotIn(('program', 2, 'create'), changes)
+        self.assertEqual(len(changes), 2 + len(self.PROGRAMS))
+        self.assertEqual(self.latest(), latest)
+
+    def test_backfill(self):
+        db.session.execute('DELETE FROM catalog_change')
+        backfill(db.session)
+        db.session.commit()
+        db.session.remove()
+        changes = self.changes()
+        self.assertEqual(len(changes), 2 + len(self.PROGRAMS))
+        self.assertEqual(set(op for kind, record_id, op in changes),
+                         set(['create']))
+
+
+class ChangesEndpointTest(CatalogTestCase):
+
+    def test_pages(self):
+        seen = []
+        url = '/changes?limit=3'
+        while True:
+            data = json.loads(self.client.get(url).data)
+            seen.extend((i['type'], i['id']) for i in data['Changes'])
+            url = data['next']
+            if not data['more']:
+                break
+        self.assertEqual(len(seen), 2 + len(self.PROGRAMS))
+        # No new changes: the cursor stays put.
+        data = json.loads(self.client.get(url).data)
+        self.assertEqual(data['Changes'], [])
+        self.assertIn('since=' + data['cursor'], url)
+        self.add_program('Amos \'n\' Andy')
+        data = json.loads(self.client.get(url).data)
+        self.assertEqual([(i['type'], i['id'], i['op'])
+                          for i in data['Changes']],
+                         [('program', 6, 'create')])
+
+    def test_invalid_cursor(self):
+        for cursor in ['garbage', encode_cursor([-1]), encode_cursor([True]),
+                       encode_cursor(['1']), encode_cursor([1, 2])]:
+            response = self.client.get('/changes?since=' + cursor)
+            self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+"""Tests for conditional GETs (conditional.py) of the JSON endpoints."""
+
+from tests.support import CatalogTestCase
+
+import unittest
+
+
+class ConditionalGetTest(CatalogTestCase):
+
+    def check_not_modified(self, url):
+        """Check that 'url' answers a repeated request with 304.
+
+        Returns:
+            str: The ETag header of the first response.
+        """
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, '')
+        self.assertEqual(response.headers['ETag'], etag)
+        return etag
+
+    def test_genres(self):
+        self.check_not_modified('/genres/JSON')
+
+    def test_genre_programs(self):
+        self.check_not_modified(
+            '/genre/{}/programs/JSON'.format(self.genre_id))
+
+    def test_program(self):
+        self.check_not_modified(
+            '/genre/{}/program/1/JSON'.format(self.genre_id))
+
+    def test_other_etag(self):
+        response = self.client.get('/genres/JSON',
+                                   headers={'If-None-Match': 'W/"stale"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Comedy', response.data)
+
+    def test_etag_depends_on_url(self):
+        first = self.client.get('/genres/JSON').headers['ETag']
+        other = self.client.get('/genres/JSON?ids=1').headers['ETag']
+        self.assertNotEqual(first, other)
+
+    def test_genres_change_after_write(self):
+        etag = self.check_not_modified('/genres/JSON')
+        self.login()
+        self.client.post('/genre/add', data={'name': 'Mystery'})
+        response = self.client.get('/genres/JSON',
+                                   headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Mystery', response.data)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_genre_programs_change_after_write(self):
+        url = '/genre/{}/programs/JSON'.format(self.genre_id)
+        etag = self.check_not_modified(url)
+        self.add_program('Amos \'n\' Andy')
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_if_modified_since(self):
+        url = '/genre/{}/program/1/JSON'.format(self.genre_id)
+        last_modified = self.client.get(url).headers['Last-Modified']
+        response = self.client.get(
+            url, headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            url, headers={'If-Modified-Since':
+                          'Mon, 01 Jan 2001 00:00:00 GMT'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_genres_offer_no_last_modified(self):
+        response = self.client.get('/genres/JSON')
+        self.assertNotIn('Last-Modified', response.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
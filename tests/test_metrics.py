@@ -0,0 +1,77 @@
+"""Tests for request and SQL instrumentation (metrics.py)."""
+
+from tests.support import CatalogTestCase, app
+from application import metrics
+from metrics import Histogram, Metrics
+
+import re
+import unittest
+
+
+class HistogramTest(unittest.TestCase):
+
+    def test_buckets_are_cumulative(self):
+        histogram = Histogram((1, 5, 10))
+        for value in (0, 3, 7, 20):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [1, 2, 3])
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.sum, 30)
+
+
+class RenderTest(unittest.TestCase):
+
+    def test_registered_metrics(self):
+        registry = Metrics()
+        registry.register('otr_things', 'gauge', 'Things.', lambda: 3)
+        registry.register('otr_lookups_total', 'counter', 'Lookups.',
+                          lambda: {(('result', 'hit'),): 2})
+        text = registry.render()
+        self.assertIn('# TYPE otr_things gauge\notr_things 3\n', text)
+        self.assertIn('otr_lookups_total{result="hit"} 2\n', text)
+
+
+class RequestMetricsTest(CatalogTestCase):
+
+    def tearDown(self):
+        app.config['DB_TIMING_HEADERS'] = False
+        CatalogTestCase.tearDown(self)
+
+    def metric(self, name, endpoint):
+        """Return the value of metric 'name' for 'endpoint' (or 0)."""
+        match = re.search(r'^%s\{endpoint="%s"\} (\S+)$' % (name, endpoint),
+                          metrics.render(), re.M)
+        return float(match.group(1)) if match else 0
+
+    def test_timing_headers(self):
+        url = '/genre/{}/program/1/JSON'.format(self.genre_id)
+        self.assertNotIn('X-DB-Queries', self.client.get(url).headers)
+        app.config['DB_TIMING_HEADERS'] = True
+        response = self.client.get(url)
+        self.assertGreater(int(response.headers['X-DB-Queries']), 0)
+        self.assertGreaterEqual(float(response.headers['X-DB-Time']), 0)
+
+    def test_counts_requests_and_queries(self):
+        requests = self.metric('otr_requests_total', 'showProgramJSON')
+        queries = self.metric('otr_db_queries_total', 'showProgramJSON')
+        app.config['DB_TIMING_HEADERS'] = True
+        response = self.client.get(
+            '/genre/{}/program/1/JSON'.format(self.genre_id))
+        self.assertEqual(
+            self.metric('otr_requests_total', 'showProgramJSON'),
+            requests + 1)
+        self.assertEqual(
+            self.metric('otr_db_queries_total', 'showProgramJSON'),
+            queries + int(response.headers['X-DB-Queries']))
+
+    def test_metrics_endpoint(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        self.assertIn('# TYPE otr_request_duration_seconds histogram',
+                      response.data)
+        self.assertIn('otr_startup_seconds ', response.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
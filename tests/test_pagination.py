@@ -0,0 +1,98 @@
+"""Tests for keyset pagination (pagination.py) and paged program lists."""
+
+from tests.support import CatalogTestCase
+from database import db
+from models import Program
+from pagination import (decode_cursor, encode_cursor, keyset_page,
+                        page_size)
+
+import json
+import unittest
+
+
+class CursorTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        token = encode_cursor([u'Vic and Sade', 4])
+        self.assertNotIn('=', token)
+        self.assertEqual(decode_cursor(token, (basestring, int)),
+                         [u'Vic and Sade', 4])
+
+    def test_rejects_garbage(self):
+        for token in ['not a cursor', '!!!!', encode_cursor({'a': 1})[:-1],
+                      encode_cursor({'a': 1})]:
+            self.assertRaises(ValueError, decode_cursor, token)
+
+    def test_rejects_wrong_types(self):
+        for values in [[4, u'Vic and Sade'], [u'Vic and Sade'],
+                       [u'Vic and Sade', 4, 5], [u'Vic and Sade', True],
+                       [u'Vic and Sade', 4.5], [None, 4]]:
+            self.assertRaises(ValueError, decode_cursor,
+                              encode_cursor(values), (basestring, int))
+
+    def test_page_size(self):
+        self.assertEqual(page_size(None, 20, 100), 20)
+        self.assertEqual(page_size(0, 20, 100), 1)
+        self.assertEqual(page_size(500, 20, 100), 100)
+
+
+class KeysetPageTest(CatalogTestCase):
+
+    def pages(self, limit):
+        """Return the pages of the seeded genre's programs."""
+        pages, cursor = [], None
+        while True:
+            rows, cursor = keyset_page(
+                db.session.query(Program).filter_by(genre_id=self.genre_id),
+                [Program.name, Program.id], cursor, limit)
+            pages.append([i.name for i in rows])
+            if cursor is None:
+                return pages
+
+    def test_pages_cover_list(self):
+        pages = self.pages(2)
+        self.assertEqual([len(i) for i in pages], [2, 2, 1])
+        self.assertEqual(sum(pages, []), self.program_names())
+
+    def test_last_page_has_no_cursor(self):
+        self.assertEqual(self.pages(len(self.PROGRAMS)),
+                         [self.program_names()])
+
+    def test_rejects_cursor_for_other_keys(self):
+        query = db.session.query(Program)
+        self.assertRaises(ValueError, keyset_page, query,
+                          [Program.name, Program.id],
+                          encode_cursor([1, 2]), 2)
+
+
+class ProgramPagesTest(CatalogTestCase):
+
+    def json_pages(self, limit):
+        """Return the pages of /genre/<id>/programs/JSON."""
+        pages = []
+        url = '/genre/{}/programs/JSON?limit={}'.format(self.genre_id, limit)
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.data)
+            pages.append([i['name'] for i in data['Programs']])
+            url = data['next']
+        return pages
+
+    def test_json_pages_cover_list(self):
+        pages = self.json_pages(2)
+        self.assertEqual([len(i) for i in pages], [2, 2, 1])
+        self.assertEqual(sum(pages, []), self.program_names())
+
+    def test_invalid_cursor(self):
+        for cursor in ['garbage', encode_cursor([1, 2]),
+                       encode_cursor(['Vic and Sade'])]:
+            for url in ['/genre/{}?after={}', '/genre/{}/programs/JSON'
+                                              '?after={}']:
+                response = self.client.get(url.format(self.genre_id,
+                                                      cursor))
+                self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
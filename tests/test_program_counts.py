@@ -0,0 +1,80 @@
+"""Tests for the upkeep of Genre.program_count (program_counts.py)."""
+
+from tests.support import CatalogTestCase
+from database import db
+from models import Genre, Program
+from program_counts import recount
+
+import io
+import json
+import unittest
+
+
+class ProgramCountTest(CatalogTestCase):
+
+    def counts(self):
+        """Return the stored program counts, by genre id."""
+        try:
+            return dict(db.session.query(Genre.id, Genre.program_count))
+        finally:
+            db.session.remove()
+
+    def expected(self):
+        """Return the program counts, by genre id, from the programs."""
+        return {self.genre_id: len(self.PROGRAMS), self.other_genre_id: 0}
+
+    def test_seeded(self):
+        self.assertEqual(self.counts(), self.expected())
+
+    def test_add(self):
+        self.add_program('Amos \'n\' Andy')
+        self.add_program('Gunsmoke', genre_id=self.other_genre_id)
+        self.assertEqual(self.counts(), {self.genre_id: 6,
+                                         self.other_genre_id: 1})
+
+    def test_delete(self):
+        self.login()
+        self.client.post('/genre/{}/program/1/delete'.format(self.genre_id))
+        self.assertEqual(self.counts()[self.genre_id], 4)
+
+    def test_move(self):
+        program = db.session.query(Program).get(1)
+        program.genre_id = self.other_genre_id
+        db.session.commit()
+        db.session.remove()
+        self.assertEqual(self.counts(), {self.genre_id: 4,
+                                         self.other_genre_id: 1})
+
+    def test_edit_keeps_count(self):
+        self.login()
+        self.client.post('/genre/{}/program/1/edit'.format(self.genre_id),
+                         data={'name': 'Fibber McGee', 'yearBegan': '1935',
+                               'yearEnded': '1959', 'description': ''})
+        self.assertEqual(self.counts(), self.expected())
+
+    def test_bulk_import(self):
+        self.login()
+        data = ('name,genre,yearBegan,yearEnded\n'
+                'Gunsmoke,Drama,1952,1961\n'
+                'Amos \'n\' Andy,Comedy,1928,1960\n'
+                'Suspense,Drama,1942,1962\n')
+        response = self.client.post(
+            '/programs/import',
+            data={'file': (io.BytesIO(data), 'programs.csv')})
+        self.assertEqual(json.loads(response.data)['inserted'], 3)
+        self.assertEqual(self.counts(), {self.genre_id: 6,
+                                         self.other_genre_id: 2})
+
+    def test_recount(self):
+        db.session.execute(Genre.__table__.update().values(program_count=9))
+        self.assertEqual(recount(db.session), [
+            (self.genre_id, 9, len(self.PROGRAMS)),
+            (self.other_genre_id, 9, 0)])
+        self.assertEqual(recount(db.session), [])
+        db.session.commit()
+        db.session.remove()
+        self.assertEqual(self.counts(), self.expected())
+
+
+if __name__ == '__main__':
+    unittest.main()
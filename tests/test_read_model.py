@@ -0,0 +1,193 @@
+"""Tests for the shared read model (read_model.py) and its use by the app."""
+
+from tests.support import CatalogTestCase
+from application import catalogVersion, read_model, read_model_writer
+from pagination import encode_cursor
+from read_model import ReadModel, ReadModelWriter, read_version, write
+
+import HTMLParser
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+
+GENRES = [(2, u'Comedy', 1), (1, u'Drama', None), (3, u'Western', 1)]
+# In the database's (name, id) order, which is not Python's for these.
+PROGRAMS = [(10, u'\xc9clair', 2, 1940, 1941),
+            (11, u'alpha', 2, 1930, 1935),
+            (12, u'Beta', 2, 1950, 1952),
+            (13, u'Gunsmoke', 3, 1952, 1961),
+            (14, u'Orphan', None, 1940, 1940)]
+
+
+def listed(html):
+    """Return the program names listed by a genre page's 'html'."""
+    unescape = HTMLParser.HTMLParser().unescape
+    return [unescape(i.strip()) for i in re.findall(
+        r"program/\d+/show'>\s*([^(<]+)\(", html.decode('utf-8'))]
+
+
+class ReadModelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'catalog.rm')
+        self.generation = write(self.path, GENRES, PROGRAMS, 7)
+        self.model = ReadModel(self.path)
+        self.assertTrue(self.model.refresh())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def names(self, page):
+        programs, more = page
+        return [i.name for i in programs], more
+
+    def test_header(self):
+        self.assertEqual(self.generation, 1)
+        self.assertEqual(self.model.generation, 1)
+        self.assertEqual(self.model.version, 7)
+        self.assertEqual(read_version(self.path), 7)
+        self.assertTrue(self.model.usable())
+
+    def test_genres(self):
+        self.assertEqual([tuple(i) for i in self.model.genres()],
+                         [(2, u'Comedy', 1, 3), (1, u'Drama', None, 0),
+                          (3, u'Western', 1, 1)])
+        self.assertEqual(self.model.genre(3).name, u'Western')
+        self.assertIsNone(self.model.genre(4))
+
+    def test_programs_keep_order(self):
+        programs, more = self.model.programs(2)
+        self.assertEqual([tuple(i) for i in programs],
+                         [(10, u'\xc9clair', 2, 1940, 1941),
+                          (11, u'alpha', 2, 1930, 1935),
+                          (12, u'Beta', 2, 1950, 1952)])
+        self.assertFalse(more)
+        self.assertEqual(self.model.programs(1), ([], False))
+        self.assertEqual(self.model.programs(99), ([], False))
+
+    def test_pages(self):
+        self.assertEqual(self.names(self.model.programs(2, None, 2)),
+                         ([u'\xc9clair', u'alpha'], True))
+        self.assertEqual(
+            self.names(self.model.programs(2, (u'alpha', 11), 2)),
+            ([u'Beta'], False))
+        self.assertEqual(
+            self.names(self.model.programs(2, (u'Beta', 12), 2)),
+            ([], False))
+
+    def test_unknown_cursor(self):
+        # Deleted, renamed or in another genre: read the database.
+        self.assertIsNone(self.model.programs(2, (u'Gone', 99), 2))
+        self.assertIsNone(self.model.programs(2, (u'Alpha', 11), 2))
+        self.assertIsNone(self.model.programs(2, (u'Gunsmoke', 13), 2))
+
+    def test_refresh(self):
+        self.assertFalse(self.model.refresh())
+        write(self.path, GENRES[:1], PROGRAMS[:1], 8)
+        self.assertTrue(self.model.refresh())
+        self.assertEqual(self.model.generation, 2)
+        self.assertEqual(self.model.version, 8)
+        self.assertEqual(self.names(self.model.programs(2)),
+                         ([u'\xc9clair'], False))
+
+    def test_expect(self):
+        self.model.expect(8)
+        self.assertFalse(self.model.usable())
+        write(self.path, GENRES, PROGRAMS, 8)
+        self.model.refresh()
+        self.assertTrue(self.model.usable())
+
+    def test_missing_file(self):
+        model = ReadModel(os.path.join(self.tmp, 'missing.rm'))
+        self.assertFalse(model.refresh())
+        self.assertFalse(model.usable())
+
+    def test_writer_skips_current_file(self):
+        versions = [7]
+        loads = []
+
+        def load():
+            loads.append(1)
+            return GENRES, PROGRAMS
+        writer = ReadModelWriter(self.model, load, lambda: versions[-1])
+        writer.refresh()
+        self.assertEqual((len(loads), writer.builds), (0, 0))
+        versions.append(9)
+        writer.refresh()
+        self.assertEqual((len(loads), writer.builds), (1, 1))
+        self.assertEqual(read_version(self.path), 9)
+
+
+class AppReadModelTest(CatalogTestCase):
+
+    def setUp(self):
+        CatalogTestCase.setUp(self)
+        read_model.configure(os.path.join(self.tmp, 'catalog.rm'))
+        read_model_writer.refresh()
+
+    def names(self, url):
+        """Return the program names listed by genre page 'url'."""
+        return listed(self.client.get(url).data)
+
+    def pages(self, limit):
+        """Return the pages of the seeded genre's programs."""
+        pages = []
+        url = '/genre/{}?limit={}'.format(self.genre_id, limit)
+        while url:
+            html = self.client.get(url).data
+            pages.append(listed(html))
+            match = re.search(r'after=([A-Za-z0-9_-]+)[^>]*>Next page', html)
+            url = match and '/genre/{}?limit={}&after={}'.format(
+                self.genre_id, limit, match.group(1))
+        return pages
+
+    def test_written_from_database(self):
+        self.client.get('/')
+        self.assertEqual(read_model.version, catalogVersion())
+        self.assertTrue(read_model.usable())
+        self.assertEqual(read_model.genre(self.genre_id).program_count,
+                         len(self.PROGRAMS))
+
+    def test_pages_match_database(self):
+        self.client.get('/')
+        from_model = self.pages(2)
+        read_model.configure(None)
+        self.assertEqual(self.pages(2), from_model)
+        self.assertEqual(sum(from_model, []), self.program_names())
+
+    def test_served_from_read_model(self):
+        # A file listing a program the database lacks shows where pages
+        # are read from.
+        write(read_model.path, [(self.genre_id, u'Comedy', self.user_id)],
+              [(99, u'Only In The Read Model', self.genre_id, 1940, 1941)],
+              catalogVersion())
+        url = '/genre/{}'.format(self.genre_id)
+        self.assertEqual(self.names(url), [u'Only In The Read Model'])
+        # A cursor for a program not in the file is paged from the
+        # database.
+        names = self.program_names()
+        cursor = encode_cursor([u'Fibber McGee and Molly', 1])
+        self.assertEqual(self.names(url + '?after=' + cursor),
+                         names[names.index(u'Fibber McGee and Molly') + 1:])
+
+    def test_own_write_reads_database(self):
+        self.client.get('/')
+        self.add_program('Amos \'n\' Andy')
+        self.assertFalse(read_model.usable())
+        with self.client.session_transaction() as s:
+            s['primary_until'] = 0
+        names = self.names('/genre/{}'.format(self.genre_id))
+        self.assertIn(u'Amos \'n\' Andy', names)
+        read_model_writer.refresh()
+        self.client.get('/')
+        self.assertTrue(read_model.usable())
+        self.assertEqual(self.names('/genre/{}'.format(self.genre_id)),
+                         names)
+
+
+if __name__ == '__main__':
+    unittest.main()